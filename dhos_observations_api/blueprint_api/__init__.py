@@ -257,6 +257,8 @@ def get_latest_observation_set_by_encounter_id(
           content:
             application/json:
               schema: ObservationSetResponse
+        '304':
+          description: The observation set is unchanged from the ETag in If-None-Match
         default:
           description: >-
               Error, e.g. 404 Not Found, 503 Service Unavailable
@@ -369,6 +371,8 @@ def get_observation_set_by_id(
           content:
             application/json:
               schema: ObservationSetResponse
+        '304':
+          description: The observation set is unchanged from the ETag in If-None-Match
         default:
           description: >-
               Error, e.g. 404 Not Found, 503 Service Unavailable
@@ -719,9 +723,9 @@ def get_observation_sets(modified_since: str, compact: bool = False) -> Response
 def refresh_agg_observation_sets() -> Response:
     """---
     post:
-      summary: Refresh agg_observation_sets MATERIALIZED VIEW
+      summary: Refresh agg_observation_sets
       description: >-
-          Refresh the data in the Aggregate observations set view
+          Recompute the aggregate observation set data changed since the last refresh
       tags: [observation]
       responses:
         '200':
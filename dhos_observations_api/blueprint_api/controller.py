@@ -25,6 +25,7 @@ from dhos_observations_api.models.api_spec import (
 )
 from dhos_observations_api.models.sql.agg_observation_sets import AggObservationSets
 from dhos_observations_api.models.sql.observation import Observation
+from dhos_observations_api.models.sql.observation_metadata import ObservationMetaData
 from dhos_observations_api.models.sql.observation_set import ObservationSet
 
 AGG_DEFAULT: Dict = {
@@ -96,45 +97,34 @@ def create_observation_set(
 
 def update_mins_late_for_encounter(encounter_id: str) -> None:
     """
-    Query finds all observation sets for a given encounter
-    it orders them by record_time it then gives each row an incrementing row number
-    it then joins a copy of this row matching the current row number with the
-    row number + 1 so that the previous row and the current row are joined on
-    the same row. This allows the current row's record_time to be subtracted
-    from the previous row's time_next_obs_set_due to provide the number of minutes
-    an observation set it late. Each rows late value is then used to update its
+    Query finds all observation sets for a given encounter ordered by record_time,
+    and uses LAG to pull the previous row's time_next_obs_set_due alongside each
+    row. This allows the current row's record_time to be subtracted from the
+    previous row's time_next_obs_set_due to provide the number of minutes an
+    observation set is late. Each rows late value is then used to update its
     mins_late field. If it is the first entry in an encounter it is assumed to be
     on time and mins_late is set to 0.
     """
     sql = """
-        UPDATE observation_set 
+        UPDATE observation_set
         SET mins_late = ex.curr_obs_mins_late
-        FROM 
+        FROM
         (
-            SELECT 
+            SELECT
                 a.uuid,
                 CASE
-                    WHEN p_obs.time_next_obs_set_due is null THEN 0
+                    WHEN a.prev_time_next_obs_set_due is null THEN 0
                     ELSE
-                        ROUND((EXTRACT(hour FROM (a.record_time - p_obs.time_next_obs_set_due ))*60*60
-                        + EXTRACT(minutes FROM (a.record_time - p_obs.time_next_obs_set_due))*60
-                        + EXTRACT(seconds FROM (a.record_time - p_obs.time_next_obs_set_due)))/60)
+                        ROUND(EXTRACT(epoch FROM (a.record_time - a.prev_time_next_obs_set_due))/60)
                 END AS curr_obs_mins_late
             FROM
                 (
-                    SELECT ROW_NUMBER() OVER (ORDER BY encounter_id, record_time) rn, 
-                    o.uuid, o.time_next_obs_set_due, o.record_time, o.encounter_id
+                    SELECT o.uuid, o.record_time,
+                    LAG(o.time_next_obs_set_due) OVER (ORDER BY o.record_time) prev_time_next_obs_set_due
                     FROM observation_set o
                     WHERE o.encounter_id = :encounter_id
                 ) a
-            LEFT JOIN 
-                (select ROW_NUMBER() OVER (ORDER BY encounter_id, record_time) rn,
-                o.uuid, o.time_next_obs_set_due, o.record_time, o.encounter_id
-                FROM observation_set o
-                WHERE o.encounter_id = :encounter_id
-                ) p_obs
-            on a.rn = p_obs.rn + 1
-        ) ex 
+        ) ex
         WHERE observation_set.uuid = ex.uuid
         AND observation_set.encounter_id = :encounter_id
     """
@@ -209,14 +199,9 @@ def get_observation_set_by_id(
     return observation_set.to_dict(compact=compact)
 
 
-def get_observation_sets_by_locations_and_date_range(
-    location_uuids: List[str],
-    start_date_str: str,
-    end_date_str: str,
-    limit: int = None,
-    compact: bool = False,
-) -> List[ObservationSetResponse.Meta.Dict]:
-
+def _parse_date_range(
+    start_date_str: str, end_date_str: str
+) -> Tuple[datetime, datetime]:
     # Check dates are formatted correctly
     today = date.today()
 
@@ -231,6 +216,18 @@ def get_observation_sets_by_locations_and_date_range(
             today.year, today.month, today.day, 23, 59, 59, 999_999, tzinfo=timezone.utc
         ),
     )
+    return start_date, end_date
+
+
+def get_observation_sets_by_locations_and_date_range(
+    location_uuids: List[str],
+    start_date_str: str,
+    end_date_str: str,
+    limit: int = None,
+    compact: bool = False,
+) -> List[ObservationSetResponse.Meta.Dict]:
+
+    start_date, end_date = _parse_date_range(start_date_str, end_date_str)
 
     if start_date > end_date:
         logger.debug(
@@ -297,19 +294,44 @@ def get_observation_sets_for_encounters(
 def get_latest_observation_set_for_encounters(
     encounter_ids: List[str], compact: bool = False
 ) -> ObservationSetResponse.Meta.Dict:
-    obs_set_query: Query = query_observation_sets_for_encounters(
-        encounter_ids=encounter_ids, limit=1
+    # Hot read path, so this uses a single Core select across the three tables
+    # rather than loading ORM instances.
+    obs_set_table = ObservationSet.__table__
+    obs_table = Observation.__table__
+    metadata_table = ObservationMetaData.__table__
+
+    latest_uuid = (
+        select(obs_set_table.c.uuid)
+        .where(obs_set_table.c.encounter_id.in_(encounter_ids))
+        .order_by(obs_set_table.c.record_time.desc())
+        .limit(1)
+        .scalar_subquery()
     )
+    query = (
+        select(obs_set_table, obs_table, metadata_table)
+        .select_from(
+            obs_set_table.outerjoin(
+                obs_table, obs_table.c.observation_set_uuid == obs_set_table.c.uuid
+            ).outerjoin(
+                metadata_table, metadata_table.c.observation_uuid == obs_table.c.uuid
+            )
+        )
+        .where(obs_set_table.c.uuid == latest_uuid)
+    )
+    rows = [row._mapping for row in db.session.execute(query)]
 
-    latest_observation_set: Optional[ObservationSet] = obs_set_query.first()
-
-    if latest_observation_set is None:
+    if not rows:
         raise EntityNotFoundException(
             f"Encounter {', '.join(encounter_ids)} has no observation sets"
         )
 
-    # The obs sets are already sorted by record_time descending, so just return the first.
-    return latest_observation_set.to_dict(compact=compact)
+    latest_observation_set = ObservationSet.row_to_dict(rows[0], compact=compact)
+    latest_observation_set["observations"] = [
+        Observation.row_to_dict(row)
+        for row in rows
+        if row[obs_table.c.uuid] is not None
+    ]
+    return latest_observation_set  # type:ignore
 
 
 def get_latest_observation_sets_by_encounter_ids(
@@ -395,8 +417,10 @@ def get_observation_sets(
 
 def refresh_agg_observation_sets() -> AggregateUpdateResponse.Meta.Dict:
     start = time.time()
-    sql = "REFRESH MATERIALIZED VIEW agg_observation_sets;"
-    db.engine.execute(text(sql))
+    # Recomputes only the buckets queued by the observation_set triggers since the
+    # last refresh. It is a SELECT, so autocommit has to be asked for explicitly.
+    sql = "SELECT refresh_agg_observation_sets();"
+    db.engine.execute(text(sql).execution_options(autocommit=True))
     end = time.time()
 
     return {"time_taken": f"{end-start:.3f} seconds"}
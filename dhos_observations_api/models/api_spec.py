@@ -10,6 +10,7 @@ from flask_batteries_included.helpers.apispec import (
     openapi_schema,
 )
 from marshmallow import EXCLUDE, Schema, fields
+from marshmallow.validate import Length
 
 dhos_observations_api_spec: APISpec = APISpec(
     version="1.0.0",
@@ -131,7 +132,10 @@ class ObservationRequest(Schema):
             observation_unit: str
             observation_metadata: ObservationMetadataRequest.Meta.Dict
 
-    observation_type = fields.String(required=True, metadata={"example": "heart_rate"})
+    # Matches the length of the observation.observation_type column
+    observation_type = fields.String(
+        required=True, validate=Length(max=64), metadata={"example": "heart_rate"}
+    )
     measured_time = fields.AwareDateTime(
         required=True, metadata={"example": "2017-09-23T08:29:19.123+00:00"}
     )
@@ -3,6 +3,8 @@ from sqlalchemy.orm import column_property
 
 
 class AggObservationSets(ModelIdentifier, db.Model):
+    # Kept up to date by the refresh_agg_observation_sets() database function, which
+    # recomputes the rows for buckets queued by triggers on observation_set.
     record_day = db.Column(db.String(), nullable=False)
     location_id = db.Column(db.String(), nullable=False)
     score_severity = db.Column(db.String(), nullable=False)
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy.types import DateTime, TypeDecorator
+
+
+class UtcDateTime(TypeDecorator):
+    """
+    Timezone-aware datetime column that always loads as UTC. Postgres returns
+    aware datetimes already, but sqlite drops the timezone so naive values are
+    stamped as UTC on the way out.
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_result_value(
+        self, value: Optional[datetime], dialect: Any
+    ) -> Optional[datetime]:
+        if value is None or value.tzinfo is not None:
+            return value
+        return value.replace(tzinfo=timezone.utc)
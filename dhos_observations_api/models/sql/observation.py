@@ -1,11 +1,36 @@
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Mapping
 
 from flask_batteries_included.helpers.security.jwt import current_jwt_user
 from flask_batteries_included.sqldb import ModelIdentifier, db
+from sqlalchemy import Index, func
 
+from dhos_observations_api.models.sql.column_types import UtcDateTime
 from dhos_observations_api.models.sql.observation_metadata import ObservationMetaData
 
+_OBSERVATION_FIELDS = (
+    "observation_type",
+    "patient_refused",
+    "score_value",
+    "observation_value",
+    "observation_string",
+    "observation_unit",
+    "measured_time",
+    "uuid",
+)
+# The same fields with the metadata in its place in the API response
+_OBSERVATION_DICT_FIELDS = (
+    "observation_type",
+    "patient_refused",
+    "score_value",
+    "observation_value",
+    "observation_string",
+    "observation_unit",
+    "observation_metadata",
+    "measured_time",
+    "uuid",
+)
+
 
 class Observation(ModelIdentifier, db.Model):
     uuid = db.Column(
@@ -15,14 +40,16 @@ class Observation(ModelIdentifier, db.Model):
         primary_key=True,
     )
     observation_set_uuid = db.Column(
-        db.String, db.ForeignKey("observation_set.uuid"), index=True
+        db.String(length=36), db.ForeignKey("observation_set.uuid")
+    )
+    observation_type = db.Column(
+        db.String(length=64), unique=False, nullable=False, index=True
     )
-    observation_type = db.Column(db.String, unique=False, nullable=False, index=True)
     measured_time = db.Column(
-        db.DateTime(timezone=True),
+        UtcDateTime,
         unique=False,
         nullable=False,
-        default=datetime.utcnow,
+        server_default=func.now(),
     )
     patient_refused = db.Column(db.Boolean().evaluates_none(), nullable=True)
     score_value = db.Column(db.Integer().evaluates_none(), nullable=True)
@@ -36,6 +63,11 @@ class Observation(ModelIdentifier, db.Model):
         primaryjoin="Observation.uuid == ObservationMetaData.observation_uuid",
     )
 
+    # Covers loading a set's observations and per-type counts for aggregation
+    __table_args__ = (
+        Index("obs_set_type_idx", observation_set_uuid, observation_type),
+    )
+
     def __repr__(self) -> str:
         return (
             f"<Observation {self.observation_type} {self.observation_value}"
@@ -78,41 +110,27 @@ class Observation(ModelIdentifier, db.Model):
         else:
             metadata = self.observation_metadata.to_dict()
 
-        measured_time = self.measured_time
-        if measured_time.tzinfo is None:
-            # sqlite loses utc, shouldn't happen outside tests
-            measured_time = measured_time.replace(tzinfo=timezone.utc)
-
         return {
-            "observation_type": self.observation_type,
-            "patient_refused": self.patient_refused,
-            "score_value": self.score_value,
-            "observation_value": self.observation_value,
-            "observation_string": self.observation_string,
-            "observation_unit": self.observation_unit,
-            "observation_metadata": metadata,
-            "measured_time": measured_time,
-            "uuid": self.uuid,
+            field: metadata if field == "observation_metadata" else getattr(self, field)
+            for field in _OBSERVATION_DICT_FIELDS
         }
 
     def to_map_dict(self) -> Dict:
-        measured_time = (
-            datetime.utcnow() if self.measured_time is None else self.measured_time
-        )
-
-        if measured_time.tzinfo is None:
-            # sqlite loses utc, shouldn't happen outside tests
-            measured_time = measured_time.replace(tzinfo=timezone.utc)
+        result = {field: getattr(self, field) for field in _OBSERVATION_FIELDS}
+        if result["measured_time"] is None:
+            result["measured_time"] = datetime.now(tz=timezone.utc)
+        return result
 
+    @classmethod
+    def row_to_dict(cls, row: Mapping) -> Dict:
+        columns = cls.__table__.c
+        if row[ObservationMetaData.__table__.c.uuid] is None:
+            metadata = None
+        else:
+            metadata = ObservationMetaData.row_to_dict(row)
         return {
-            "observation_type": self.observation_type,
-            "patient_refused": self.patient_refused,
-            "score_value": self.score_value,
-            "observation_value": self.observation_value,
-            "observation_string": self.observation_string,
-            "observation_unit": self.observation_unit,
-            "measured_time": measured_time,
-            "uuid": self.uuid,
+            field: metadata if field == "observation_metadata" else row[columns[field]]
+            for field in _OBSERVATION_DICT_FIELDS
         }
 
     def on_patch(self) -> None:
@@ -1,8 +1,21 @@
-from typing import Dict, Optional
+from typing import Dict, Mapping, Optional
 
 from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.sqldb import ModelIdentifier, db
 
+_OBSERVATION_METADATA_FIELDS = (
+    "mask",
+    "mask_percent",
+    "gcs_eyes",
+    "gcs_eyes_description",
+    "gcs_verbal",
+    "gcs_verbal_description",
+    "gcs_motor",
+    "gcs_motor_description",
+    "patient_position",
+    "uuid",
+)
+
 
 class ObservationMetaData(ModelIdentifier, db.Model):
     uuid = db.Column(
@@ -11,7 +24,12 @@ class ObservationMetaData(ModelIdentifier, db.Model):
         nullable=False,
         primary_key=True,
     )
-    observation_uuid = db.Column(db.String, db.ForeignKey("observation.uuid"))
+    observation_uuid = db.Column(
+        db.String(length=36),
+        db.ForeignKey("observation.uuid"),
+        index=True,
+        unique=True,
+    )
     mask = db.Column(db.String().evaluates_none(), nullable=True)
     mask_percent = db.Column(db.Integer().evaluates_none(), nullable=True)
     gcs_eyes = db.Column(db.Integer().evaluates_none(), nullable=True)
@@ -54,30 +72,12 @@ class ObservationMetaData(ModelIdentifier, db.Model):
         )
 
     def to_dict(self) -> Dict:
-        return {
-            "mask": self.mask,
-            "mask_percent": self.mask_percent,
-            "gcs_eyes": self.gcs_eyes,
-            "gcs_eyes_description": self.gcs_eyes_description,
-            "gcs_verbal": self.gcs_verbal,
-            "gcs_verbal_description": self.gcs_verbal_description,
-            "gcs_motor": self.gcs_motor,
-            "gcs_motor_description": self.gcs_motor_description,
-            "patient_position": self.patient_position,
-            "uuid": self.uuid,
-        }
+        return {field: getattr(self, field) for field in _OBSERVATION_METADATA_FIELDS}
 
     def to_map_dict(self) -> Dict:
-        return {
-            "mask": self.mask,
-            "mask_percent": self.mask_percent,
-            "gcs_eyes": self.gcs_eyes,
-            "gcs_eyes_description": self.gcs_eyes_description,
-            "gcs_verbal": self.gcs_verbal,
-            "gcs_verbal_description": self.gcs_verbal_description,
-            "gcs_motor": self.gcs_motor,
-            "gcs_motor_description": self.gcs_motor_description,
-            "patient_position": self.patient_position,
-            "uuid": self.uuid,
-            "observation_uuid": self.observation_uuid,
-        }
+        return {**self.to_dict(), "observation_uuid": self.observation_uuid}
+
+    @classmethod
+    def row_to_dict(cls, row: Mapping) -> Dict:
+        columns = cls.__table__.c
+        return {field: row[columns[field]] for field in _OBSERVATION_METADATA_FIELDS}
@@ -1,7 +1,8 @@
+import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Union
+from uuid import UUID
 
-from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.security.jwt import current_jwt_user
 from flask_batteries_included.sqldb import ModelIdentifier, db
 from sqlalchemy import Index
@@ -10,9 +11,60 @@ from dhos_observations_api.models.api_spec import (
     ObservationRequest,
     ObservationSetResponse,
 )
+from dhos_observations_api.models.sql.column_types import UtcDateTime
 from dhos_observations_api.models.sql.observation import Observation
 from dhos_observations_api.models.sql.observation_metadata import ObservationMetaData
 
+_OBSERVATION_SET_FIELDS = (
+    "encounter_id",
+    "patient_id",
+    "score_system",
+    "score_string",
+    "score_value",
+    "score_severity",
+    "record_time",
+    "spo2_scale",
+    "observations",
+    "is_partial",
+    "empty_set",
+    "ranking",
+    "time_next_obs_set_due",
+    "monitoring_instruction",
+    "location",
+    "mins_late",
+)
+_OBSERVATION_SET_FULL_FIELDS = _OBSERVATION_SET_FIELDS + (
+    "obx_reference_range",
+    "obx_abnormal_flags",
+)
+# Every column, without the observations which new() merges in afterwards
+_OBSERVATION_SET_MAP_FIELDS = (
+    "encounter_id",
+    "patient_id",
+    "score_system",
+    "score_string",
+    "score_value",
+    "score_severity",
+    "record_time",
+    "spo2_scale",
+    "is_partial",
+    "empty_set",
+    "ranking",
+    "time_next_obs_set_due",
+    "monitoring_instruction",
+    "location",
+    "obx_reference_range",
+    "obx_abnormal_flags",
+    "mins_late",
+)
+
+
+def _generate_uuids(count: int) -> Iterator[str]:
+    # Draw the entropy for every UUID in a single read rather than one per UUID.
+    raw = os.urandom(16 * count)
+    for offset in range(0, len(raw), 16):
+        yield str(UUID(bytes=raw[offset : offset + 16], version=4))
+
 
 class ObservationSet(ModelIdentifier, db.Model):
     # Required fields
@@ -23,7 +75,7 @@ class ObservationSet(ModelIdentifier, db.Model):
         primary_key=True,
     )
     encounter_id = db.Column(db.String(length=36), nullable=True, index=True)
-    record_time = db.Column(db.DateTime(timezone=True), unique=False, nullable=False)
+    record_time = db.Column(UtcDateTime, unique=False, nullable=False)
     score_system = db.Column(db.String, nullable=True)
     observations = db.relationship(
         Observation,
@@ -36,7 +88,7 @@ class ObservationSet(ModelIdentifier, db.Model):
     score_severity = db.Column(db.String, nullable=True)
     monitoring_instruction = db.Column(db.String, nullable=True)
     time_next_obs_set_due = db.Column(
-        db.DateTime(timezone=True), unique=False, nullable=True, default=None
+        UtcDateTime, unique=False, nullable=True, default=None
     )
     spo2_scale = db.Column(db.Integer, nullable=True, default=1)
     is_partial = db.Column(db.Boolean, nullable=True)
@@ -53,8 +105,12 @@ class ObservationSet(ModelIdentifier, db.Model):
     patient_id = db.Column(db.String(length=36), nullable=True, index=True)
     mins_late = db.Column(db.Integer, nullable=True)
 
-    # Index to help finding latest obs set per encounter
-    __table_args__ = (Index("encounter_record_time", encounter_id, record_time.desc()),)
+    __table_args__ = (
+        # Index to help finding latest obs set per encounter
+        Index("encounter_record_time", encounter_id, record_time.desc()),
+        # Index to help recomputing a day of agg_observation_sets
+        Index("record_time_idx", record_time),
+    )
 
     @classmethod
     def new(
@@ -64,29 +120,26 @@ class ObservationSet(ModelIdentifier, db.Model):
         observations: List[ObservationRequest.Meta.Dict] = None,
         **kw: Any,
     ) -> Dict:
+        # One UUID for the set, plus one per observation and per metadata.
+        uuids = _generate_uuids(1 + 2 * len(observations or []))
         if not uuid:
-            uuid = generate_uuid()
+            uuid = next(uuids)
 
         if kw.get("spo2_scale", None) is None:
             kw["spo2_scale"] = 1
 
-        if kw.get("created_by_", None) is None:
-            kw["created_by_"] = current_jwt_user()
-
-        if kw.get("created", None) is None:
-            kw["created"] = datetime.utcnow()
-
-        if kw.get("modified_by_", None) is None:
-            kw["modified_by_"] = current_jwt_user()
-
-        if kw.get("modified", None) is None:
-            kw["modified"] = datetime.utcnow()
+        user = current_jwt_user()
+        now = datetime.utcnow()
+        kw.setdefault("created_by_", user)
+        kw.setdefault("created", now)
+        kw.setdefault("modified_by_", user)
+        kw.setdefault("modified", now)
 
         observation_models: List[Observation] = []
         observation_metadatas: List[ObservationMetaData] = []
         if observations:
             for obs in observations:
-                obs_uuid: str = generate_uuid()
+                obs_uuid: str = next(uuids)
                 observation_metadata = obs.pop("observation_metadata", None)
                 observation_models.append(
                     Observation.new(uuid=obs_uuid, observation_set_uuid=uuid, **obs)
@@ -95,7 +148,9 @@ class ObservationSet(ModelIdentifier, db.Model):
                 if observation_metadata:
                     observation_metadatas.append(
                         ObservationMetaData.new(
-                            observation_uuid=obs_uuid, **observation_metadata
+                            observation_uuid=obs_uuid,
+                            uuid=next(uuids),
+                            **observation_metadata,
                         )
                     )
 
@@ -145,71 +200,46 @@ class ObservationSet(ModelIdentifier, db.Model):
 
     def to_dict(self, compact: bool = True) -> ObservationSetResponse.Meta.Dict:
         observations = [o.to_dict() for o in self.observations]
-        record_time = self.record_time
-
-        if record_time.tzinfo is None:
-            # sqlite loses utc, shouldn't happen outside tests
-            record_time = record_time.replace(tzinfo=timezone.utc)
-
-        result: ObservationSetResponse.Meta.Dict = {
-            "encounter_id": self.encounter_id,
-            "patient_id": self.patient_id,
-            "score_system": self.score_system,
-            "score_string": self.score_string,
-            "score_value": self.score_value,
-            "score_severity": self.score_severity,
-            "record_time": record_time,
-            "spo2_scale": self.spo2_scale,
-            "observations": observations,
-            "is_partial": self.is_partial,
-            "empty_set": self.empty_set,
-            "ranking": self.ranking,
-            "time_next_obs_set_due": self.time_next_obs_set_due,
-            "monitoring_instruction": self.monitoring_instruction,
-            "location": self.location,
-            "mins_late": self.mins_late,
-        }
 
-        if not compact:
-            result.update(
-                {
-                    "obx_reference_range": self.obx_reference_range,
-                    "obx_abnormal_flags": self.obx_abnormal_flags,
-                }
-            )
+        fields = _OBSERVATION_SET_FIELDS if compact else _OBSERVATION_SET_FULL_FIELDS
+        result: ObservationSetResponse.Meta.Dict = {  # type:ignore
+            field: observations if field == "observations" else getattr(self, field)
+            for field in fields
+        }
         result.update(self.pack_identifier())  # type:ignore
         return result
 
     def to_map_dict(self) -> Dict:
-        record_time = self.record_time
-
-        if record_time.tzinfo is None:
-            # sqlite loses utc, shouldn't happen outside tests
-            record_time = record_time.replace(tzinfo=timezone.utc)
-
-        result = {
-            "encounter_id": self.encounter_id,
-            "patient_id": self.patient_id,
-            "score_system": self.score_system,
-            "score_string": self.score_string,
-            "score_value": self.score_value,
-            "score_severity": self.score_severity,
-            "record_time": record_time,
-            "spo2_scale": self.spo2_scale,
-            "is_partial": self.is_partial,
-            "empty_set": self.empty_set,
-            "ranking": self.ranking,
-            "time_next_obs_set_due": self.time_next_obs_set_due,
-            "monitoring_instruction": self.monitoring_instruction,
-            "location": self.location,
-            "obx_reference_range": self.obx_reference_range,
-            "obx_abnormal_flags": self.obx_abnormal_flags,
-            "mins_late": self.mins_late,
-        }
+        result = {field: getattr(self, field) for field in _OBSERVATION_SET_MAP_FIELDS}
         result.update(self.pack_identifier())  # type:ignore
 
         return result
 
+    @classmethod
+    def row_to_dict(cls, row: Mapping, compact: bool = True) -> Dict:
+        """
+        Builds the same dict as to_dict from a Core result row keyed by column,
+        with an empty observations list for the caller to fill in.
+        """
+        columns = cls.__table__.c
+        fields = _OBSERVATION_SET_FIELDS if compact else _OBSERVATION_SET_FULL_FIELDS
+        result: Dict = {
+            field: [] if field == "observations" else row[columns[field]]
+            for field in fields
+        }
+        # Same as ModelIdentifier.pack_identifier(), which stamps the naive audit
+        # timestamps as UTC.
+        result.update(
+            {
+                "uuid": row[columns.uuid],
+                "created": row[columns.created].replace(tzinfo=timezone.utc),
+                "created_by": row[columns.created_by_],
+                "modified": row[columns.modified].replace(tzinfo=timezone.utc),
+                "modified_by": row[columns.modified_by_],
+            }
+        )
+        return result
+
     def on_patch(self) -> None:
         self.modified = datetime.utcnow()
         self.modified_by_ = current_jwt_user()
@@ -1,5 +1,6 @@
 import codecs
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import sadisplay
 
@@ -9,6 +10,21 @@ from dhos_observations_api.models.sql import (
     observation_set,
 )
 
+
+def write_plantuml(desc: tuple) -> None:
+    with codecs.open("docs/schema.plantuml", "w", encoding="utf-8") as f:
+        f.write(sadisplay.plantuml(desc).rstrip() + "\n")
+
+
+def write_dot(desc: tuple) -> None:
+    with codecs.open("docs/schema.dot", "w", encoding="utf-8") as f:
+        f.write(sadisplay.dot(desc).rstrip() + "\n")
+
+    my_cmd = ["dot", "-Tpng", "docs/schema.dot"]
+    with open("docs/schema.png", "wb") as outfile:
+        subprocess.run(my_cmd, stdout=outfile, check=True)
+
+
 desc = sadisplay.describe(
     [
         observation.Observation,
@@ -16,12 +32,7 @@ desc = sadisplay.describe(
         observation_metadata.ObservationMetaData,
     ]
 )
-with codecs.open("docs/schema.plantuml", "w", encoding="utf-8") as f:
-    f.write(sadisplay.plantuml(desc).rstrip() + "\n")
-
-with codecs.open("docs/schema.dot", "w", encoding="utf-8") as f:
-    f.write(sadisplay.dot(desc).rstrip() + "\n")
-
-my_cmd = ["dot", "-Tpng", "docs/schema.dot"]
-with open("docs/schema.png", "w") as outfile:
-    subprocess.run(my_cmd, stdout=outfile)
+with ThreadPoolExecutor(max_workers=2) as executor:
+    futures = [executor.submit(write_plantuml, desc), executor.submit(write_dot, desc)]
+    for future in futures:
+        future.result()
@@ -1,15 +1,22 @@
 import logging
-from typing import Dict, Generator
+import os
+from collections import deque
+from typing import Deque, Dict, Generator, Optional
 
+import orjson
 from behave import fixture
 from behave.runner import Context
 from environs import Env
 from kombu import Connection, Exchange, Message, Queue
 from kombu.simple import SimpleQueue
-from kombu.utils import json
 
 logger = logging.getLogger("Tests")
 
+MESSAGES = {
+    "ENCOUNTER_UPDATED": "dhos.DM000007",
+    "OBSERVATION_SET_UPDATED": "dhos.DM000004",
+}
+
 
 @fixture
 def create_messaging_connection(context: Context) -> Generator[Connection, None, None]:
@@ -36,36 +43,99 @@ def create_messaging_queues(
     connection = context.messaging_connection
     exchange = context.messaging_exchange
     context.messaging_queues = {}
+    context.messaging_buffers = {}
     for name, routing_key in routing_keys.items():
+        # Each test process gets its own exclusive queue, so parallel workers all
+        # see every message instead of competing for them on a shared queue.
         queue = Queue(
-            routing_key, exchange=exchange, routing_key=routing_key, channel=connection
+            f"{routing_key}.{os.getpid()}",
+            exchange=exchange,
+            routing_key=routing_key,
+            channel=connection,
+            exclusive=True,
         )
         queue.declare()
         context.messaging_queues[routing_key] = SimpleQueue(connection, queue)
+        context.messaging_buffers[routing_key] = deque()
 
     yield context.messaging_queues
 
-    messages = []
-    for routing_key, queue in context.messaging_queues.items():
-        if len(queue) != 0:
-            messages.append(routing_key)
-            logger.warning(f"Queue not empty {routing_key} length {len(queue)}")
+    for queue in context.messaging_queues.values():
         queue.clear()
         queue.close()
     del context.messaging_queues
+    del context.messaging_buffers
 
-    assert not messages, "Unexpected rabbit messages: " + ", ".join(
-        k for k in routing_keys if routing_keys[k] in messages
+
+def _message_encounter_id(body: Dict) -> Optional[str]:
+    if "encounter_id" in body:
+        return body["encounter_id"]
+    for action in body.get("actions", []):
+        return action.get("data", {}).get("observation_set", {}).get("encounter_id")
+    return None
+
+
+def _is_for_scenario(context: Context, body: Dict) -> bool:
+    # Scenarios running in other processes publish to the same routing keys.
+    encounter_uuid: Optional[str] = getattr(context, "encounter_uuid", None)
+    message_encounter_id: Optional[str] = _message_encounter_id(body)
+    return (
+        encounter_uuid is None
+        or message_encounter_id is None
+        or message_encounter_id == encounter_uuid
     )
 
 
-def get_message(context: Context, routing_key: str, timeout: int = 20) -> Dict:
+def drain_messages(
+    context: Context, routing_key: str, timeout: Optional[int] = 20
+) -> None:
+    """
+    Moves every message currently on the queue into the context buffer. Unless
+    timeout is None, waits up to timeout seconds for the first one if the buffer
+    is empty. Messages for other scenarios' encounters are acknowledged and dropped.
+    """
     queue: SimpleQueue = context.messaging_queues[routing_key]
-    message: Message = queue.get(block=True, timeout=timeout)
+    buffer: Deque[Dict] = context.messaging_buffers[routing_key]
+    message: Message
+    while timeout is not None and not buffer:
+        message = queue.get(block=True, timeout=timeout)
+        _buffer_message(context, buffer, message)
+    while True:
+        try:
+            message = queue.get_nowait()
+        except queue.Empty:
+            break
+        _buffer_message(context, buffer, message)
+
+
+def _buffer_message(context: Context, buffer: Deque[Dict], message: Message) -> None:
+    # The queues share the connection's default channel, so each message is
+    # acked on its own: a multiple ack would also cover the other queues' messages.
     message.ack()
-    return json.loads(message.body)
+    body: Dict = orjson.loads(message.body)
+    if _is_for_scenario(context, body):
+        buffer.append(body)
+
+
+def get_message(context: Context, routing_key: str, timeout: int = 20) -> Dict:
+    if not context.messaging_buffers[routing_key]:
+        drain_messages(context, routing_key, timeout=timeout)
+    return context.messaging_buffers[routing_key].popleft()
 
 
 def assert_message_queues_are_empty(context: Context) -> None:
-    for routing_key, queue in context.messaging_queues.items():
-        assert len(queue) == 0, f"Queue not empty {routing_key} length {len(queue)}"
+    """
+    Fails if the scenario left any of its messages unconsumed, emptying the
+    buffers either way so the next scenario starts clean.
+    """
+    messages = []
+    for routing_key, buffer in context.messaging_buffers.items():
+        drain_messages(context, routing_key, timeout=None)
+        if buffer:
+            messages.append(routing_key)
+            logger.warning(f"Queue not empty {routing_key} length {len(buffer)}")
+        buffer.clear()
+
+    assert not messages, "Unexpected rabbit messages: " + ", ".join(
+        k for k in MESSAGES if MESSAGES[k] in messages
+    )
@@ -1,8 +1,23 @@
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 import requests
 from environs import Env
 from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retry only covers idempotent methods by default, so POST and PATCH are never
+# resubmitted.
+_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+)
+_session = requests.Session()
+_session.headers["Connection"] = "keep-alive"
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
 
 
 def _get_base_url() -> str:
@@ -10,7 +25,7 @@ def _get_base_url() -> str:
 
 
 def post_observation_set(observation_set_data: Dict, jwt: str) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/observation_set",
         headers={"Authorization": f"Bearer {jwt}"},
         json=observation_set_data,
@@ -18,19 +33,61 @@ def post_observation_set(observation_set_data: Dict, jwt: str) -> Response:
     )
 
 
-def get_latest_observation_set(encounter_uuid: str, jwt: str) -> Response:
-    return requests.get(
+def post_observation_sets(
+    observation_sets_data: List[Dict], jwt: str
+) -> List[Response]:
+    """
+    Posts observation sets, responses in request order. Sets for the same
+    encounter are posted one after another, as each create recalculates
+    mins_late for the encounter, and only different encounters run concurrently.
+    """
+    by_encounter: Dict[Optional[str], List[int]] = {}
+    for index, data in enumerate(observation_sets_data):
+        by_encounter.setdefault(data.get("encounter_id"), []).append(index)
+
+    responses: List[Optional[Response]] = [None] * len(observation_sets_data)
+
+    def post_in_order(indexes: List[int]) -> None:
+        for index in indexes:
+            responses[index] = post_observation_set(
+                observation_set_data=observation_sets_data[index], jwt=jwt
+            )
+
+    if by_encounter:
+        with ThreadPoolExecutor(max_workers=len(by_encounter)) as executor:
+            list(executor.map(post_in_order, by_encounter.values()))
+    return responses  # type:ignore
+
+
+def get_latest_observation_set(
+    encounter_uuid: str, jwt: str, cache: Optional[Dict[str, Response]] = None
+) -> Response:
+    """
+    If a cache is given, revalidates the cached response for the encounter with
+    If-None-Match and returns it again when the API replies 304 Not Modified.
+    """
+    headers = {"Authorization": f"Bearer {jwt}"}
+    cached: Optional[Response] = None if cache is None else cache.get(encounter_uuid)
+    if cached is not None and "ETag" in cached.headers:
+        headers["If-None-Match"] = cached.headers["ETag"]
+
+    response = _session.get(
         f"{_get_base_url()}/dhos/v2/observation_set/latest",
-        headers={"Authorization": f"Bearer {jwt}"},
+        headers=headers,
         timeout=15,
         params={"encounter_id": encounter_uuid},
     )
+    if cached is not None and response.status_code == 304:
+        return cached
+    if cache is not None and response.status_code == 200:
+        cache[encounter_uuid] = response
+    return response
 
 
 def patch_observation_set(
     observation_set_uuid: str, observation_set_data: Dict, jwt: str
 ) -> Response:
-    return requests.patch(
+    return _session.patch(
         f"{_get_base_url()}/dhos/v2/observation_set/{observation_set_uuid}",
         headers={"Authorization": f"Bearer {jwt}"},
         json=observation_set_data,
@@ -39,7 +96,7 @@ def patch_observation_set(
 
 
 def post_observation_set_count(encounter_uuids: List, jwt: str) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/observation_set/count",
         headers={"Authorization": f"Bearer {jwt}"},
         json=encounter_uuids,
@@ -50,7 +107,7 @@ def post_observation_set_count(encounter_uuids: List, jwt: str) -> Response:
 def post_latest_observations_by_encounter_list(
     encounter_uuids: List, jwt: str
 ) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/observation_set/latest",
         headers={"Authorization": f"Bearer {jwt}"},
         json=encounter_uuids,
@@ -61,7 +118,7 @@ def post_latest_observations_by_encounter_list(
 def get_observation_sets_by_location(
     location_uuid: str, start_date: str, end_date: str, jwt: str
 ) -> Response:
-    return requests.get(
+    return _session.get(
         f"{_get_base_url()}/dhos/v2/observation_set_search",
         headers={"Authorization": f"Bearer {jwt}"},
         timeout=15,
@@ -76,7 +133,7 @@ def get_observation_sets_by_location(
 def post_observation_sets_by_location_list(
     location_uuids: List, start_date: str, end_date: str, jwt: str
 ) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/observation_set_search",
         headers={"Authorization": f"Bearer {jwt}"},
         timeout=15,
@@ -88,7 +145,7 @@ def post_observation_sets_by_location_list(
 def post_agg_observation_sets_by_month(
     location_uuids: List, start_date: str, end_date: str, jwt: str
 ) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/observation_sets_by_month",
         headers={"Authorization": f"Bearer {jwt}"},
         timeout=15,
@@ -98,7 +155,7 @@ def post_agg_observation_sets_by_month(
 
 
 def post_refresh_agg_observation_sets(jwt: str) -> Response:
-    return requests.post(
+    return _session.post(
         f"{_get_base_url()}/dhos/v2/aggregate_obs",
         headers={"Authorization": f"Bearer {jwt}"},
         timeout=15,
@@ -108,7 +165,7 @@ def post_refresh_agg_observation_sets(jwt: str) -> Response:
 def get_agg_observation_sets_by_location_by_month(
     start_date: str, end_date: str, jwt: str
 ) -> Response:
-    return requests.get(
+    return _session.get(
         f"{_get_base_url()}/dhos/v2/observation_sets_by_month",
         headers={"Authorization": f"Bearer {jwt}"},
         timeout=15,
@@ -1,6 +1,12 @@
-from behave import use_step_matcher
+from behave import use_fixture, use_step_matcher
 from behave.model import Feature, Scenario, Step
 from behave.runner import Context
+from clients.messaging_client import (
+    MESSAGES,
+    assert_message_queues_are_empty,
+    create_messaging_connection,
+    create_messaging_queues,
+)
 from reporting import init_report_portal
 
 use_step_matcher("re")
@@ -8,6 +14,9 @@ use_step_matcher("re")
 
 def before_all(context: Context) -> None:
     init_report_portal(context)
+    # Declared once per run rather than once per scenario.
+    use_fixture(create_messaging_connection, context=context)
+    use_fixture(create_messaging_queues, context=context, routing_keys=MESSAGES)
 
 
 def before_feature(context: Context, feature: Feature) -> None:
@@ -20,6 +29,7 @@ def before_scenario(context: Context, scenario: Scenario) -> None:
     )
     context.observation_set_data = []
     context.created_observation_sets = []
+    context.latest_observation_set_cache = {}
 
 
 def before_step(context: Context, step: Step) -> None:
@@ -36,6 +46,7 @@ def after_scenario(context: Context, scenario: Scenario) -> None:
     context.behave_integration_service.after_scenario(
         scenario, scenario_id=context.scenario_id
     )
+    assert_message_queues_are_empty(context)
 
 
 def after_feature(context: Context, feature: Feature) -> None:
@@ -9,16 +9,14 @@ Feature: Observation set aggregation
   
   Scenario: Aggregate observation sets by month report
     Given a patient is admitted to a ward
-      And an observation set is created for a patient
-      And another observation set is created for the patient
+      And 2 observation sets are created for the patient
       And observation set aggregation has processed
     When aggregate observation sets by month report requested
     Then aggregate observation sets are returned
     
   Scenario: Aggregate observation sets by location by month report
     Given a patient is admitted to a ward
-      And an observation set is created for a patient
-      And another observation set is created for the patient
+      And 2 observation sets are created for the patient
       And observation set aggregation has processed
     When aggregate observation sets by location by month report requested
     Then aggregate location based observation sets are returned
@@ -24,8 +24,7 @@ Feature: Observation set submission
     Then the observation set response is correct
 
   Scenario: Latest observation set gets returned even if earlier observation set is updated
-    Given an observation set is created for a patient
-    And another observation set is created for the patient
+    Given 2 observation sets are created for the patient
     And observation set 1 is updated
     When a latest observation set is retrieved for the encounter
     Then observation set 2 is returned
@@ -117,23 +117,28 @@ def assert_observations_set_body(
         ).has_is_partial(
             expected_observation_set["is_partial"]
         )
+        actual_observations: Dict[str, Dict] = {
+            actual_observation["observation_type"]: actual_observation
+            for actual_observation in actual_observation_set["observations"]
+        }
         for expected_observation in expected_observation_set["observations"]:
-            for actual_observation in actual_observation_set["observations"]:
-                if (
-                    actual_observation["observation_type"]
-                    == expected_observation["observation_type"]
-                ):
-                    if "measured_time" in actual_observation:
-                        actual_observation["measured_time"] = parser.isoparse(
-                            actual_observation["measured_time"]
-                        )
+            actual_observation = actual_observations.get(
+                expected_observation["observation_type"]
+            )
+            if actual_observation is None:
+                continue
 
-                    assert_that(actual_observation).has_measured_time(
-                        parser.isoparse(expected_observation["measured_time"])
-                    ).has_patient_refused(
-                        expected_observation["patient_refused"]
-                    ).has_observation_unit(
-                        expected_observation["observation_unit"]
-                    ).has_observation_value(
-                        expected_observation["observation_value"]
-                    )
+            if "measured_time" in actual_observation:
+                actual_observation["measured_time"] = parser.isoparse(
+                    actual_observation["measured_time"]
+                )
+
+            assert_that(actual_observation).has_measured_time(
+                parser.isoparse(expected_observation["measured_time"])
+            ).has_patient_refused(
+                expected_observation["patient_refused"]
+            ).has_observation_unit(
+                expected_observation["observation_unit"]
+            ).has_observation_value(
+                expected_observation["observation_value"]
+            )
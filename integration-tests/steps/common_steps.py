@@ -4,7 +4,7 @@ from behave import given, step
 from behave.runner import Context
 from helpers.jwt import get_system_token
 from messaging_steps import assert_message_published
-from request_steps import create_observation_set
+from request_steps import create_observation_set, create_observation_sets
 
 
 @given("a valid JWT")
@@ -27,3 +27,13 @@ def create_obs_set(context: Context) -> None:
     create_observation_set(context)
     assert_message_published(context, "OBSERVATION_SET_UPDATED")
     assert_message_published(context, "ENCOUNTER_UPDATED")
+
+
+@step("(?P<count>\d+) observation sets are created for (?:a|the) patient")
+def create_obs_sets(context: Context, count: str) -> None:
+    # Submit every set before waiting on rabbit so the API processes them
+    # together rather than one message round trip at a time.
+    create_observation_sets(context, int(count))
+    for _ in range(int(count)):
+        assert_message_published(context, "OBSERVATION_SET_UPDATED")
+        assert_message_published(context, "ENCOUNTER_UPDATED")
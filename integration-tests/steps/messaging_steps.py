@@ -1,22 +1,12 @@
-from behave import given, then, use_fixture
+from behave import given, then
 from behave.runner import Context
-from clients.messaging_client import (
-    create_messaging_connection,
-    create_messaging_queues,
-    get_message,
-)
-
-MESSAGES = {
-    "ENCOUNTER_UPDATED": "dhos.DM000007",
-    "OBSERVATION_SET_UPDATED": "dhos.DM000004",
-}
+from clients.messaging_client import MESSAGES, get_message
 
 
 @given("the messaging broker is running")
 def create_messaging_broker_queues(context: Context) -> None:
-    if not hasattr(context, "messaging_connection"):
-        use_fixture(create_messaging_connection, context=context)
-        use_fixture(create_messaging_queues, context=context, routing_keys=MESSAGES)
+    # The connection and queues are set up once per run in before_all.
+    assert context.messaging_connection.connected
 
 
 @then("a(?:n?) (?P<message_name>\w+) message is published")
@@ -1,5 +1,5 @@
-from datetime import datetime, timezone
-from typing import Dict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
 
 from behave import step, when
 from behave.runner import Context
@@ -12,6 +12,7 @@ from clients.observations_api_client import (
     post_latest_observations_by_encounter_list,
     post_observation_set,
     post_observation_set_count,
+    post_observation_sets,
     post_observation_sets_by_location_list,
     post_refresh_agg_observation_sets,
 )
@@ -36,6 +37,27 @@ def create_observation_set(context: Context) -> None:
     context.observation_set_uuid = context.observation_set_response.json()["uuid"]
 
 
+def create_observation_sets(context: Context, count: int) -> None:
+    # Record times are spaced out explicitly so the sets sort in the order they
+    # were generated.
+    now: datetime = datetime.now(tz=timezone.utc)
+    obs_set_requests: List[Dict] = [
+        generate_observation_set_request(
+            encounter_uuid=context.encounter_uuid,
+            location_uuid=context.location_uuid,
+            measured_time=now + timedelta(milliseconds=i),
+        )
+        for i in range(count)
+    ]
+    context.observation_set_data.extend(obs_set_requests)
+    responses: List[Response] = post_observation_sets(
+        observation_sets_data=obs_set_requests, jwt=context.system_jwt
+    )
+    context.created_observation_sets.extend(responses)
+    context.observation_set_response = responses[-1]
+    context.observation_set_uuid = context.observation_set_response.json()["uuid"]
+
+
 @when("the observation set is updated")
 def update_current_observation_set(context: Context) -> None:
     obs_set: Response = context.created_observation_sets[-1]
@@ -58,7 +80,9 @@ def request_observation_set_count(context: Context) -> None:
 @step("a latest observation set is retrieved for the encounter")
 def get_latest_observation_set_by_encounter_uuid(context: Context) -> None:
     context.observation_set_response = get_latest_observation_set(
-        encounter_uuid=context.encounter_uuid, jwt=context.system_jwt
+        encounter_uuid=context.encounter_uuid,
+        jwt=context.system_jwt,
+        cache=context.latest_observation_set_cache,
     )
 
 
@@ -91,11 +115,14 @@ def retrieve_observation_sets_by_location_list(context: Context) -> None:
 
 def _do_update_observation_set(context: Context, obs_set_uuid: str) -> None:
     context.observation_set_patch_request = generate_update_observation_set_request()
-    adapter_worker_jwt: str = get_system_token("dhos-observations-adapter-worker")
+    if not hasattr(context, "adapter_worker_jwt"):
+        context.adapter_worker_jwt = get_system_token(
+            "dhos-observations-adapter-worker"
+        )
     context.observation_set_patch_response = patch_observation_set(
         observation_set_uuid=obs_set_uuid,
         observation_set_data=context.observation_set_patch_request,
-        jwt=adapter_worker_jwt,
+        jwt=context.adapter_worker_jwt,
     )
 
 
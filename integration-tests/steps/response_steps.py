@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Dict, List
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
 from behave import step, then
 from behave.runner import Context
@@ -35,16 +35,15 @@ def assert_observation_set_response(context: Context) -> None:
 def assert_patch_response(context: Context) -> None:
     assert context.observation_set_patch_response.status_code == 200
     expected = context.observation_set_response.json()  # unpatched obs set
+    expected_by_type: Dict[str, Dict] = {
+        obs["observation_type"]: obs for obs in expected["observations"]
+    }
+    find_expected = expected_by_type.get
     for patch in context.observation_set_patch_request["observations"]:
         # add the bits from patch request
-        expected["observations"] = list(
-            map(
-                lambda obs: {**obs, **patch}
-                if patch["observation_type"] == obs["observation_type"]
-                else obs,
-                expected["observations"],
-            )
-        )
+        expected_obs: Optional[Dict] = find_expected(patch["observation_type"])
+        if expected_obs is not None:
+            expected_obs.update(patch)
 
     assert_observations_set_body(
         actual_observation_set=context.observation_set_patch_response.json(),
@@ -57,12 +56,12 @@ def assert_obs_set_in_search_list(context: Context) -> None:
     assert context.observation_set_response.status_code == 200
     returned: List = context.observation_set_response.json()
 
-    obs_set_data: List[Dict] = [
-        o for o in returned if o["encounter_id"] == context.encounter_uuid
-    ]
-    assert obs_set_data
+    obs_set_data: Optional[Dict] = next(
+        (o for o in returned if o["encounter_id"] == context.encounter_uuid), None
+    )
+    assert obs_set_data is not None
     assert_observations_set_body(
-        actual_observation_set=obs_set_data[0],
+        actual_observation_set=obs_set_data,
         expected_observation_set=context.observation_set_data[-1],
     )
 
@@ -89,7 +88,7 @@ def assert_aggregate_obs_set_returned(context: Context) -> None:
     assert context.agg_observation_sets_by_month_response.status_code == 200
     returned: Dict = context.agg_observation_sets_by_month_response.json()
     assert returned
-    yyyymm = str(datetime.now())[:7]
+    yyyymm = datetime.now(tz=timezone.utc).strftime("%Y-%m")
     assert 2 == returned[yyyymm]["all_obs_sets"]
 
 
@@ -98,5 +97,5 @@ def assert_aggregate_location_based_obs_set_returned(context: Context) -> None:
     assert context.agg_observation_sets_by_location_by_month_response.status_code == 200
     returned: Dict = context.agg_observation_sets_by_location_by_month_response.json()
     assert returned
-    yyyymm = str(datetime.now())[:7]
+    yyyymm = datetime.now(tz=timezone.utc).strftime("%Y-%m")
     assert 2 == returned[context.location_uuid][yyyymm]["all_obs_sets"]
@@ -7,7 +7,9 @@ from helpers.observations_helper import assert_observations_set_body
 @then("the observation set is stored")
 def assert_last_obs_set_is_returned(context: Context) -> None:
     response = get_latest_observation_set(
-        encounter_uuid=context.encounter_uuid, jwt=context.system_jwt
+        encounter_uuid=context.encounter_uuid,
+        jwt=context.system_jwt,
+        cache=context.latest_observation_set_cache,
     )
     assert_observations_set_body(
         actual_observation_set=response.json(),
@@ -0,0 +1,176 @@
+"""agg_obs_width_bucket
+
+Revision ID: 1f6d83b5a0c7
+Revises: e4b7c09a1f25
+Create Date: 2026-10-16 13:10:26.551930
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1f6d83b5a0c7"
+down_revision = "e4b7c09a1f25"
+branch_labels = None
+depends_on = None
+
+
+def _create_indexes():
+    op.create_index(
+        "location_id_idx", "agg_observation_sets", ["location_id"], unique=False
+    )
+    op.create_index(
+        "record_day_idx", "agg_observation_sets", ["record_day"], unique=False
+    )
+    op.create_index(
+        "score_severity_idx", "agg_observation_sets", ["score_severity"], unique=False
+    )
+    op.create_index(
+        "agg_obs_unique_idx",
+        "agg_observation_sets",
+        ["record_day", "location_id", "score_severity"],
+        unique=True,
+    )
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute("DROP MATERIALIZED VIEW agg_observation_sets;")
+    # Classify each obs set into its mins_late bucket once with width_bucket,
+    # rather than testing every bucket range per row.
+    conn.execute(
+        """
+        CREATE MATERIALIZED VIEW agg_observation_sets AS
+        SELECT
+            to_char(os.record_time, 'YYYY-MM-DD') as record_day
+            , os.location location_id
+            , os.score_severity
+            , count(*) all_obs_sets
+            , count(*) filter (where os.mins_late > 0) late_obs_sets
+            , count(*) filter (where os.is_partial = true) missing_obs
+            , coalesce(sum(o.o2_therapy_status), 0)::bigint o2_therapy_status
+            , coalesce(sum(o.heart_rate), 0)::bigint heart_rate
+            , coalesce(sum(o.spo2), 0)::bigint spo2
+            , coalesce(sum(o.temperature), 0)::bigint temperature
+            , coalesce(sum(o.diastolic_blood_pressure), 0)::bigint diastolic_blood_pressure
+            , coalesce(sum(o.respiratory_rate), 0)::bigint respiratory_rate
+            , coalesce(sum(o.consciousness_acvpu), 0)::bigint consciousness_acvpu
+            , coalesce(sum(o.systolic_blood_pressure), 0)::bigint systolic_blood_pressure
+            , coalesce(sum(o.nurse_concern), 0)::bigint nurse_concern
+            , count(*) filter (where os.mins_late_bucket = 0) minus60
+            , count(*) filter (where os.mins_late_bucket = 1) minus45_59
+            , count(*) filter (where os.mins_late_bucket = 2) minus30_44
+            , count(*) filter (where os.mins_late_bucket = 3) minus15_29
+            , count(*) filter (where os.mins_late_bucket = 4) minus0_14
+            , count(*) filter (where os.mins_late_bucket = 5) plus1_15
+            , count(*) filter (where os.mins_late_bucket = 6) plus16_30
+            , count(*) filter (where os.mins_late_bucket = 7) plus31_45
+            , count(*) filter (where os.mins_late_bucket = 8) plus46_60
+            , count(*) filter (where os.mins_late_bucket = 9) plus61_75
+            , count(*) filter (where os.mins_late_bucket = 10) plus76_90
+            , count(*) filter (where os.mins_late_bucket = 11) plus91_105
+            , count(*) filter (where os.mins_late_bucket = 12) plus106_120
+            , count(*) filter (where os.mins_late_bucket = 13) plus121_135
+            , count(*) filter (where os.mins_late_bucket = 14) plus136_150
+            , count(*) filter (where os.mins_late_bucket = 15) plus151_165
+            , count(*) filter (where os.mins_late_bucket = 16) plus166_180
+            , count(*) filter (where os.mins_late_bucket = 17) plus180
+        FROM (
+            SELECT
+                uuid
+                , record_time
+                , location
+                , score_severity
+                , is_partial
+                , mins_late
+                -- mins_late is in whole minutes, so each threshold is shifted up
+                -- by one to make the buckets include their upper bound,
+                -- e.g. bucket 1 is -59 to -45 inclusive.
+                , width_bucket(
+                    mins_late,
+                    ARRAY[-59, -44, -29, -14, 1, 16, 31, 46, 61, 76, 91, 106, 121, 136, 151, 166, 181]
+                ) mins_late_bucket
+            FROM observation_set
+        ) os
+        LEFT JOIN (
+            SELECT
+                observation_set_uuid
+                , count(*) filter (where observation_type = 'o2_therapy_status') o2_therapy_status
+                , count(*) filter (where observation_type = 'heart_rate') heart_rate
+                , count(*) filter (where observation_type = 'spo2') spo2
+                , count(*) filter (where observation_type = 'temperature') temperature
+                , count(*) filter (where observation_type = 'diastolic_blood_pressure') diastolic_blood_pressure
+                , count(*) filter (where observation_type = 'respiratory_rate') respiratory_rate
+                , count(*) filter (where observation_type = 'consciousness_acvpu') consciousness_acvpu
+                , count(*) filter (where observation_type = 'systolic_blood_pressure') systolic_blood_pressure
+                , count(*) filter (where observation_type = 'nurse_concern') nurse_concern
+            FROM observation
+            GROUP BY observation_set_uuid
+        ) o on os.uuid = o.observation_set_uuid
+        GROUP BY record_day, os.location, os.score_severity
+        ORDER BY record_day;
+        """
+    )
+    _create_indexes()
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute("DROP MATERIALIZED VIEW agg_observation_sets;")
+    conn.execute(
+        """
+        CREATE MATERIALIZED VIEW agg_observation_sets AS
+        SELECT
+            to_char(os.record_time, 'YYYY-MM-DD') as record_day
+            , os.location location_id
+            , os.score_severity
+            , count(*) all_obs_sets
+            , count(*) filter (where os.mins_late > 0) late_obs_sets
+            , count(*) filter (where os.is_partial = true) missing_obs
+            , coalesce(sum(o.o2_therapy_status), 0)::bigint o2_therapy_status
+            , coalesce(sum(o.heart_rate), 0)::bigint heart_rate
+            , coalesce(sum(o.spo2), 0)::bigint spo2
+            , coalesce(sum(o.temperature), 0)::bigint temperature
+            , coalesce(sum(o.diastolic_blood_pressure), 0)::bigint diastolic_blood_pressure
+            , coalesce(sum(o.respiratory_rate), 0)::bigint respiratory_rate
+            , coalesce(sum(o.consciousness_acvpu), 0)::bigint consciousness_acvpu
+            , coalesce(sum(o.systolic_blood_pressure), 0)::bigint systolic_blood_pressure
+            , coalesce(sum(o.nurse_concern), 0)::bigint nurse_concern
+            , count(*) filter (where os.mins_late <= -60) minus60
+            , count(*) filter (where os.mins_late > -60 and os.mins_late <= -45) minus45_59
+            , count(*) filter (where os.mins_late > -45 and os.mins_late <= -30) minus30_44
+            , count(*) filter (where os.mins_late > -30 and os.mins_late <= -15) minus15_29
+            , count(*) filter (where os.mins_late > -15 and os.mins_late <= 0) minus0_14
+            , count(*) filter (where os.mins_late > 0 and os.mins_late <= 15) plus1_15
+            , count(*) filter (where os.mins_late > 15 and os.mins_late <= 30) plus16_30
+            , count(*) filter (where os.mins_late > 30 and os.mins_late <= 45) plus31_45
+            , count(*) filter (where os.mins_late > 45 and os.mins_late <= 60) plus46_60
+            , count(*) filter (where os.mins_late > 60 and os.mins_late <= 75) plus61_75
+            , count(*) filter (where os.mins_late > 75 and os.mins_late <= 90) plus76_90
+            , count(*) filter (where os.mins_late > 90 and os.mins_late <= 105) plus91_105
+            , count(*) filter (where os.mins_late > 105 and os.mins_late <= 120) plus106_120
+            , count(*) filter (where os.mins_late > 120 and os.mins_late <= 135) plus121_135
+            , count(*) filter (where os.mins_late > 135 and os.mins_late <= 150) plus136_150
+            , count(*) filter (where os.mins_late > 150 and os.mins_late <= 165) plus151_165
+            , count(*) filter (where os.mins_late > 165 and os.mins_late <= 180) plus166_180
+            , count(*) filter (where os.mins_late > 180) plus180
+        FROM observation_set os
+        LEFT JOIN (
+            SELECT
+                observation_set_uuid
+                , count(*) filter (where observation_type = 'o2_therapy_status') o2_therapy_status
+                , count(*) filter (where observation_type = 'heart_rate') heart_rate
+                , count(*) filter (where observation_type = 'spo2') spo2
+                , count(*) filter (where observation_type = 'temperature') temperature
+                , count(*) filter (where observation_type = 'diastolic_blood_pressure') diastolic_blood_pressure
+                , count(*) filter (where observation_type = 'respiratory_rate') respiratory_rate
+                , count(*) filter (where observation_type = 'consciousness_acvpu') consciousness_acvpu
+                , count(*) filter (where observation_type = 'systolic_blood_pressure') systolic_blood_pressure
+                , count(*) filter (where observation_type = 'nurse_concern') nurse_concern
+            FROM observation
+            GROUP BY observation_set_uuid
+        ) o on os.uuid = o.observation_set_uuid
+        GROUP BY record_day, os.location, os.score_severity
+        ORDER BY record_day;
+        """
+    )
+    _create_indexes()
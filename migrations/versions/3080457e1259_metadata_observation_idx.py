@@ -0,0 +1,30 @@
+"""metadata_observation_idx
+
+Revision ID: 3080457e1259
+Revises: 76c2df9f7829
+Create Date: 2026-10-16 09:12:31.482107
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3080457e1259"
+down_revision = "76c2df9f7829"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        op.f("ix_observation_meta_data_observation_uuid"),
+        "observation_meta_data",
+        ["observation_uuid"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_observation_meta_data_observation_uuid"),
+        table_name="observation_meta_data",
+    )
@@ -0,0 +1,41 @@
+"""agg_obs_location_day_idx
+
+Revision ID: 7a0e5c92d4f8
+Revises: 1f6d83b5a0c7
+Create Date: 2026-10-16 13:38:02.906413
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7a0e5c92d4f8"
+down_revision = "1f6d83b5a0c7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Location reports filter on location_id and a record_day range. Queries on
+    # record_day alone use agg_obs_unique_idx, which leads with record_day.
+    op.create_index(
+        "agg_obs_location_day_idx",
+        "agg_observation_sets",
+        ["location_id", "record_day"],
+        unique=False,
+    )
+    op.drop_index("location_id_idx", table_name="agg_observation_sets")
+    op.drop_index("record_day_idx", table_name="agg_observation_sets")
+    op.drop_index("score_severity_idx", table_name="agg_observation_sets")
+
+
+def downgrade():
+    op.create_index(
+        "location_id_idx", "agg_observation_sets", ["location_id"], unique=False
+    )
+    op.create_index(
+        "record_day_idx", "agg_observation_sets", ["record_day"], unique=False
+    )
+    op.create_index(
+        "score_severity_idx", "agg_observation_sets", ["score_severity"], unique=False
+    )
+    op.drop_index("agg_obs_location_day_idx", table_name="agg_observation_sets")
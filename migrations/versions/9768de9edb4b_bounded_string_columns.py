@@ -0,0 +1,57 @@
+"""bounded_string_columns
+
+Revision ID: 9768de9edb4b
+Revises: 3080457e1259
+Create Date: 2026-10-16 10:03:47.215904
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9768de9edb4b"
+down_revision = "3080457e1259"
+branch_labels = None
+depends_on = None
+
+
+def _alter_columns(uuid_type, observation_type_type):
+    conn = op.get_bind()
+    # Postgres won't alter the type of a column used by a view, so the
+    # aggregate view is dropped and recreated from its stored definition.
+    view_definition = conn.execute(
+        "SELECT pg_get_viewdef('agg_observation_sets'::regclass);"
+    ).scalar()
+    conn.execute("DROP MATERIALIZED VIEW agg_observation_sets;")
+
+    op.alter_column("observation", "observation_set_uuid", type_=uuid_type)
+    op.alter_column("observation", "observation_type", type_=observation_type_type)
+    op.alter_column("observation_meta_data", "observation_uuid", type_=uuid_type)
+
+    conn.execute(f"CREATE MATERIALIZED VIEW agg_observation_sets AS {view_definition}")
+    op.create_index(
+        "location_id_idx", "agg_observation_sets", ["location_id"], unique=False
+    )
+    op.create_index(
+        "record_day_idx", "agg_observation_sets", ["record_day"], unique=False
+    )
+    op.create_index(
+        "score_severity_idx", "agg_observation_sets", ["score_severity"], unique=False
+    )
+
+
+def upgrade():
+    # Fail with a clear message rather than midway through the ALTER.
+    conn = op.get_bind()
+    too_long = conn.execute(
+        "SELECT count(*) FROM observation WHERE length(observation_type) > 64;"
+    ).scalar()
+    if too_long:
+        raise ValueError(
+            f"{too_long} observations have an observation_type over 64 characters"
+        )
+    _alter_columns(sa.String(length=36), sa.String(length=64))
+
+
+def downgrade():
+    _alter_columns(sa.String(), sa.String())
@@ -0,0 +1,353 @@
+"""agg_obs_incremental
+
+Revision ID: b3d9e1f07a62
+Revises: 7a0e5c92d4f8
+Create Date: 2026-10-16 14:05:47.318204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b3d9e1f07a62"
+down_revision = "7a0e5c92d4f8"
+branch_labels = None
+depends_on = None
+
+AGG_OBSERVATION_SETS_TABLE = """
+CREATE TABLE agg_observation_sets (
+    record_day text NOT NULL
+    , location_id varchar(36)
+    , score_severity varchar
+    , all_obs_sets bigint NOT NULL
+    , late_obs_sets bigint NOT NULL
+    , missing_obs bigint NOT NULL
+    , o2_therapy_status bigint NOT NULL
+    , heart_rate bigint NOT NULL
+    , spo2 bigint NOT NULL
+    , temperature bigint NOT NULL
+    , diastolic_blood_pressure bigint NOT NULL
+    , respiratory_rate bigint NOT NULL
+    , consciousness_acvpu bigint NOT NULL
+    , systolic_blood_pressure bigint NOT NULL
+    , nurse_concern bigint NOT NULL
+    , minus60 bigint NOT NULL
+    , minus45_59 bigint NOT NULL
+    , minus30_44 bigint NOT NULL
+    , minus15_29 bigint NOT NULL
+    , minus0_14 bigint NOT NULL
+    , plus1_15 bigint NOT NULL
+    , plus16_30 bigint NOT NULL
+    , plus31_45 bigint NOT NULL
+    , plus46_60 bigint NOT NULL
+    , plus61_75 bigint NOT NULL
+    , plus76_90 bigint NOT NULL
+    , plus91_105 bigint NOT NULL
+    , plus106_120 bigint NOT NULL
+    , plus121_135 bigint NOT NULL
+    , plus136_150 bigint NOT NULL
+    , plus151_165 bigint NOT NULL
+    , plus166_180 bigint NOT NULL
+    , plus180 bigint NOT NULL
+);
+"""
+
+# Buckets whose rows need recomputing, queued by the triggers below.
+AGG_OBSERVATION_SETS_DIRTY_TABLE = """
+CREATE TABLE agg_observation_sets_dirty (
+    record_day text NOT NULL
+    , location_id varchar(36)
+    , score_severity varchar
+);
+"""
+
+# Keeps one queued row per bucket, so the queue stays bounded by the number of
+# buckets even if nothing refreshes it. NULL locations and severities are valid
+# buckets, hence the IS NULL columns telling them apart from empty strings.
+AGG_OBSERVATION_SETS_DIRTY_INDEX = """
+CREATE UNIQUE INDEX agg_obs_dirty_unique_idx ON agg_observation_sets_dirty (
+    record_day
+    , coalesce(location_id, '')
+    , (location_id IS NULL)
+    , coalesce(score_severity, '')
+    , (score_severity IS NULL)
+);
+"""
+
+MARK_DIRTY_FUNCTION = """
+CREATE FUNCTION agg_observation_sets_mark_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO agg_observation_sets_dirty VALUES (
+            to_char(OLD.record_time, 'YYYY-MM-DD'), OLD.location, OLD.score_severity
+        ) ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO agg_observation_sets_dirty VALUES (
+            to_char(NEW.record_time, 'YYYY-MM-DD'), NEW.location, NEW.score_severity
+        ) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+INSERT_DELETE_TRIGGER = """
+CREATE TRIGGER agg_observation_sets_insert_delete
+AFTER INSERT OR DELETE ON observation_set
+FOR EACH ROW EXECUTE PROCEDURE agg_observation_sets_mark_dirty();
+"""
+
+# update_mins_late_for_encounter rewrites every obs set in the encounter, so
+# only queue the rows where an aggregated column actually changed. Observations
+# are only ever added along with their obs set, so observation needs no trigger.
+UPDATE_TRIGGER = """
+CREATE TRIGGER agg_observation_sets_update
+AFTER UPDATE ON observation_set
+FOR EACH ROW
+WHEN (
+    OLD.record_time IS DISTINCT FROM NEW.record_time
+    OR OLD.location IS DISTINCT FROM NEW.location
+    OR OLD.score_severity IS DISTINCT FROM NEW.score_severity
+    OR OLD.is_partial IS DISTINCT FROM NEW.is_partial
+    OR OLD.mins_late IS DISTINCT FROM NEW.mins_late
+)
+EXECUTE PROCEDURE agg_observation_sets_mark_dirty();
+"""
+
+# Recomputes only the queued buckets, reading each day of observation_set
+# through record_time_idx rather than scanning the whole table.
+REFRESH_FUNCTION = """
+CREATE FUNCTION refresh_agg_observation_sets() RETURNS void AS $$
+BEGIN
+    -- Two refreshes recomputing the same bucket would both insert it.
+    PERFORM pg_advisory_xact_lock(hashtext('agg_observation_sets'));
+
+    DROP TABLE IF EXISTS agg_refresh_keys;
+    CREATE TEMPORARY TABLE agg_refresh_keys (
+        record_day text
+        , location_id varchar(36)
+        , score_severity varchar
+    ) ON COMMIT DROP;
+
+    WITH dirty AS (
+        DELETE FROM agg_observation_sets_dirty
+        RETURNING record_day, location_id, score_severity
+    )
+    INSERT INTO agg_refresh_keys
+    SELECT DISTINCT record_day, location_id, score_severity FROM dirty;
+
+    DELETE FROM agg_observation_sets a
+    USING agg_refresh_keys k
+    WHERE a.record_day = k.record_day
+    AND a.location_id IS NOT DISTINCT FROM k.location_id
+    AND a.score_severity IS NOT DISTINCT FROM k.score_severity;
+
+    INSERT INTO agg_observation_sets (
+        record_day, location_id, score_severity, all_obs_sets, late_obs_sets
+        , missing_obs, o2_therapy_status, heart_rate, spo2, temperature
+        , diastolic_blood_pressure, respiratory_rate, consciousness_acvpu
+        , systolic_blood_pressure, nurse_concern, minus60, minus45_59
+        , minus30_44, minus15_29, minus0_14, plus1_15, plus16_30, plus31_45
+        , plus46_60, plus61_75, plus76_90, plus91_105, plus106_120
+        , plus121_135, plus136_150, plus151_165, plus166_180, plus180
+    )
+    SELECT
+        os.record_day
+        , os.location
+        , os.score_severity
+        , count(*)
+        , count(*) filter (where os.mins_late > 0)
+        , count(*) filter (where os.is_partial = true)
+        , sum(o.o2_therapy_status)
+        , sum(o.heart_rate)
+        , sum(o.spo2)
+        , sum(o.temperature)
+        , sum(o.diastolic_blood_pressure)
+        , sum(o.respiratory_rate)
+        , sum(o.consciousness_acvpu)
+        , sum(o.systolic_blood_pressure)
+        , sum(o.nurse_concern)
+        , count(*) filter (where os.mins_late_bucket = 0)
+        , count(*) filter (where os.mins_late_bucket = 1)
+        , count(*) filter (where os.mins_late_bucket = 2)
+        , count(*) filter (where os.mins_late_bucket = 3)
+        , count(*) filter (where os.mins_late_bucket = 4)
+        , count(*) filter (where os.mins_late_bucket = 5)
+        , count(*) filter (where os.mins_late_bucket = 6)
+        , count(*) filter (where os.mins_late_bucket = 7)
+        , count(*) filter (where os.mins_late_bucket = 8)
+        , count(*) filter (where os.mins_late_bucket = 9)
+        , count(*) filter (where os.mins_late_bucket = 10)
+        , count(*) filter (where os.mins_late_bucket = 11)
+        , count(*) filter (where os.mins_late_bucket = 12)
+        , count(*) filter (where os.mins_late_bucket = 13)
+        , count(*) filter (where os.mins_late_bucket = 14)
+        , count(*) filter (where os.mins_late_bucket = 15)
+        , count(*) filter (where os.mins_late_bucket = 16)
+        , count(*) filter (where os.mins_late_bucket = 17)
+    FROM (
+        SELECT
+            s.uuid
+            , k.record_day
+            , s.location
+            , s.score_severity
+            , s.is_partial
+            , s.mins_late
+            , width_bucket(
+                s.mins_late,
+                ARRAY[-59, -44, -29, -14, 1, 16, 31, 46, 61, 76, 91, 106, 121, 136, 151, 166, 181]
+            ) mins_late_bucket
+        FROM agg_refresh_keys k
+        JOIN observation_set s
+        ON s.record_time >= k.record_day::date
+        AND s.record_time < k.record_day::date + 1
+        AND s.location IS NOT DISTINCT FROM k.location_id
+        AND s.score_severity IS NOT DISTINCT FROM k.score_severity
+    ) os
+    CROSS JOIN LATERAL (
+        SELECT
+            count(*) filter (where observation_type = 'o2_therapy_status') o2_therapy_status
+            , count(*) filter (where observation_type = 'heart_rate') heart_rate
+            , count(*) filter (where observation_type = 'spo2') spo2
+            , count(*) filter (where observation_type = 'temperature') temperature
+            , count(*) filter (where observation_type = 'diastolic_blood_pressure') diastolic_blood_pressure
+            , count(*) filter (where observation_type = 'respiratory_rate') respiratory_rate
+            , count(*) filter (where observation_type = 'consciousness_acvpu') consciousness_acvpu
+            , count(*) filter (where observation_type = 'systolic_blood_pressure') systolic_blood_pressure
+            , count(*) filter (where observation_type = 'nurse_concern') nurse_concern
+        FROM observation
+        WHERE observation_set_uuid = os.uuid
+    ) o
+    GROUP BY os.record_day, os.location, os.score_severity;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Everything the incremental refresh needs besides agg_observation_sets itself.
+INCREMENTAL_REFRESH_DDL = (
+    AGG_OBSERVATION_SETS_DIRTY_TABLE,
+    AGG_OBSERVATION_SETS_DIRTY_INDEX,
+    MARK_DIRTY_FUNCTION,
+    INSERT_DELETE_TRIGGER,
+    UPDATE_TRIGGER,
+    REFRESH_FUNCTION,
+)
+
+# The materialized view this revision replaces, which the table has to match.
+MATERIALIZED_VIEW_QUERY = """
+SELECT
+    to_char(os.record_time, 'YYYY-MM-DD') as record_day
+    , os.location location_id
+    , os.score_severity
+    , count(*) all_obs_sets
+    , count(*) filter (where os.mins_late > 0) late_obs_sets
+    , count(*) filter (where os.is_partial = true) missing_obs
+    , coalesce(sum(o.o2_therapy_status), 0)::bigint o2_therapy_status
+    , coalesce(sum(o.heart_rate), 0)::bigint heart_rate
+    , coalesce(sum(o.spo2), 0)::bigint spo2
+    , coalesce(sum(o.temperature), 0)::bigint temperature
+    , coalesce(sum(o.diastolic_blood_pressure), 0)::bigint diastolic_blood_pressure
+    , coalesce(sum(o.respiratory_rate), 0)::bigint respiratory_rate
+    , coalesce(sum(o.consciousness_acvpu), 0)::bigint consciousness_acvpu
+    , coalesce(sum(o.systolic_blood_pressure), 0)::bigint systolic_blood_pressure
+    , coalesce(sum(o.nurse_concern), 0)::bigint nurse_concern
+    , count(*) filter (where os.mins_late_bucket = 0) minus60
+    , count(*) filter (where os.mins_late_bucket = 1) minus45_59
+    , count(*) filter (where os.mins_late_bucket = 2) minus30_44
+    , count(*) filter (where os.mins_late_bucket = 3) minus15_29
+    , count(*) filter (where os.mins_late_bucket = 4) minus0_14
+    , count(*) filter (where os.mins_late_bucket = 5) plus1_15
+    , count(*) filter (where os.mins_late_bucket = 6) plus16_30
+    , count(*) filter (where os.mins_late_bucket = 7) plus31_45
+    , count(*) filter (where os.mins_late_bucket = 8) plus46_60
+    , count(*) filter (where os.mins_late_bucket = 9) plus61_75
+    , count(*) filter (where os.mins_late_bucket = 10) plus76_90
+    , count(*) filter (where os.mins_late_bucket = 11) plus91_105
+    , count(*) filter (where os.mins_late_bucket = 12) plus106_120
+    , count(*) filter (where os.mins_late_bucket = 13) plus121_135
+    , count(*) filter (where os.mins_late_bucket = 14) plus136_150
+    , count(*) filter (where os.mins_late_bucket = 15) plus151_165
+    , count(*) filter (where os.mins_late_bucket = 16) plus166_180
+    , count(*) filter (where os.mins_late_bucket = 17) plus180
+FROM (
+    SELECT
+        uuid
+        , record_time
+        , location
+        , score_severity
+        , is_partial
+        , mins_late
+        , width_bucket(
+            mins_late,
+            ARRAY[-59, -44, -29, -14, 1, 16, 31, 46, 61, 76, 91, 106, 121, 136, 151, 166, 181]
+        ) mins_late_bucket
+    FROM observation_set
+) os
+LEFT JOIN (
+    SELECT
+        observation_set_uuid
+        , count(*) filter (where observation_type = 'o2_therapy_status') o2_therapy_status
+        , count(*) filter (where observation_type = 'heart_rate') heart_rate
+        , count(*) filter (where observation_type = 'spo2') spo2
+        , count(*) filter (where observation_type = 'temperature') temperature
+        , count(*) filter (where observation_type = 'diastolic_blood_pressure') diastolic_blood_pressure
+        , count(*) filter (where observation_type = 'respiratory_rate') respiratory_rate
+        , count(*) filter (where observation_type = 'consciousness_acvpu') consciousness_acvpu
+        , count(*) filter (where observation_type = 'systolic_blood_pressure') systolic_blood_pressure
+        , count(*) filter (where observation_type = 'nurse_concern') nurse_concern
+    FROM observation
+    GROUP BY observation_set_uuid
+) o on os.uuid = o.observation_set_uuid
+GROUP BY record_day, os.location, os.score_severity
+ORDER BY record_day
+"""
+
+
+def _create_indexes():
+    op.create_index(
+        "agg_obs_unique_idx",
+        "agg_observation_sets",
+        ["record_day", "location_id", "score_severity"],
+        unique=True,
+    )
+    op.create_index(
+        "agg_obs_location_day_idx",
+        "agg_observation_sets",
+        ["location_id", "record_day"],
+        unique=False,
+    )
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute("DROP MATERIALIZED VIEW agg_observation_sets;")
+    conn.execute(AGG_OBSERVATION_SETS_TABLE)
+    _create_indexes()
+    op.create_index("record_time_idx", "observation_set", ["record_time"], unique=False)
+    for statement in INCREMENTAL_REFRESH_DDL:
+        conn.execute(statement)
+
+    # Populate the table by queuing every existing bucket.
+    conn.execute(
+        """
+        INSERT INTO agg_observation_sets_dirty
+        SELECT DISTINCT to_char(record_time, 'YYYY-MM-DD'), location, score_severity
+        FROM observation_set;
+        """
+    )
+    conn.execute("SELECT refresh_agg_observation_sets();")
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute("DROP FUNCTION refresh_agg_observation_sets();")
+    op.drop_index("record_time_idx", table_name="observation_set")
+    conn.execute("DROP TRIGGER agg_observation_sets_update ON observation_set;")
+    conn.execute("DROP TRIGGER agg_observation_sets_insert_delete ON observation_set;")
+    conn.execute("DROP FUNCTION agg_observation_sets_mark_dirty();")
+    conn.execute("DROP TABLE agg_observation_sets_dirty;")
+    conn.execute("DROP TABLE agg_observation_sets;")
+    conn.execute(
+        f"CREATE MATERIALIZED VIEW agg_observation_sets AS {MATERIALIZED_VIEW_QUERY};"
+    )
+    _create_indexes()
@@ -0,0 +1,23 @@
+"""measured_time_server_default
+
+Revision ID: b51c7f2e08d3
+Revises: 9768de9edb4b
+Create Date: 2026-10-16 10:41:05.630218
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b51c7f2e08d3"
+down_revision = "9768de9edb4b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column("observation", "measured_time", server_default=sa.text("now()"))
+
+
+def downgrade():
+    op.alter_column("observation", "measured_time", server_default=None)
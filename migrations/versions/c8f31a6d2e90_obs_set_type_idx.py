@@ -0,0 +1,36 @@
+"""obs_set_type_idx
+
+Revision ID: c8f31a6d2e90
+Revises: 5e2a9d7c41b6
+Create Date: 2026-10-16 12:05:18.774392
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c8f31a6d2e90"
+down_revision = "5e2a9d7c41b6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "obs_set_type_idx",
+        "observation",
+        ["observation_set_uuid", "observation_type"],
+        unique=False,
+    )
+    # The composite index leads with observation_set_uuid, so it serves every
+    # lookup the single column index did.
+    op.drop_index(op.f("ix_observation_observation_set_uuid"), table_name="observation")
+
+
+def downgrade():
+    op.create_index(
+        op.f("ix_observation_observation_set_uuid"),
+        "observation",
+        ["observation_set_uuid"],
+        unique=False,
+    )
+    op.drop_index("obs_set_type_idx", table_name="observation")
@@ -0,0 +1,28 @@
+"""agg_obs_unique_idx
+
+Revision ID: e4b7c09a1f25
+Revises: c8f31a6d2e90
+Create Date: 2026-10-16 12:31:40.219857
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e4b7c09a1f25"
+down_revision = "c8f31a6d2e90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # REFRESH MATERIALIZED VIEW CONCURRENTLY needs a unique index on the view.
+    op.create_index(
+        "agg_obs_unique_idx",
+        "agg_observation_sets",
+        ["record_day", "location_id", "score_severity"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("agg_obs_unique_idx", table_name="agg_observation_sets")
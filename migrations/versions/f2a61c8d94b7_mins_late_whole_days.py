@@ -0,0 +1,71 @@
+"""mins_late_whole_days
+
+Revision ID: f2a61c8d94b7
+Revises: b3d9e1f07a62
+Create Date: 2026-10-16 16:21:08.402117
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f2a61c8d94b7"
+down_revision = "b3d9e1f07a62"
+branch_labels = None
+depends_on = None
+
+# The same computation as update_mins_late_for_encounter, for every encounter at
+# once. {late} is the lateness of a.record_time after a.prev_time_next_obs_set_due.
+_UPDATE_MINS_LATE = """
+    UPDATE observation_set
+    SET mins_late = ex.curr_obs_mins_late
+    FROM
+    (
+        SELECT
+            a.uuid,
+            CASE
+                WHEN a.prev_time_next_obs_set_due is null THEN 0
+                ELSE {late}
+            END AS curr_obs_mins_late
+        FROM
+            (
+                SELECT o.uuid, o.record_time,
+                LAG(o.time_next_obs_set_due) OVER (
+                    PARTITION BY o.encounter_id ORDER BY o.record_time
+                ) prev_time_next_obs_set_due
+                FROM observation_set o
+                WHERE o.encounter_id IS NOT NULL
+            ) a
+    ) ex
+    WHERE observation_set.uuid = ex.uuid
+    AND observation_set.mins_late IS DISTINCT FROM ex.curr_obs_mins_late;
+"""
+
+
+def upgrade():
+    print("Updating mins_late of observation sets more than a day late")
+    conn = op.get_bind()
+    conn.execute(
+        _UPDATE_MINS_LATE.format(
+            late="""
+                ROUND(EXTRACT(epoch FROM (a.record_time - a.prev_time_next_obs_set_due))/60)
+            """
+        )
+    )
+    # The observation_set triggers queued the buckets of every row changed above.
+    print("Updating `agg_observation_sets`")
+    conn.execute("SELECT refresh_agg_observation_sets();")
+
+
+def downgrade():
+    print("Dropping whole days from the mins_late of observation sets")
+    conn = op.get_bind()
+    conn.execute(
+        _UPDATE_MINS_LATE.format(
+            late="""
+                ROUND((EXTRACT(hour FROM (a.record_time - a.prev_time_next_obs_set_due))*60*60
+                + EXTRACT(minutes FROM (a.record_time - a.prev_time_next_obs_set_due))*60
+                + EXTRACT(seconds FROM (a.record_time - a.prev_time_next_obs_set_due)))/60)
+            """
+        )
+    )
+    conn.execute("SELECT refresh_agg_observation_sets();")
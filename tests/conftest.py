@@ -1,17 +1,22 @@
 import contextlib
+import functools
+import logging
 import os
-import signal
+import select
 import socket
 import sys
 import time
+from datetime import datetime, timedelta, timezone
 from typing import (
     Any,
     Callable,
     ContextManager,
     Dict,
+    FrozenSet,
     Generator,
+    Iterable,
     Iterator,
-    NoReturn,
+    List,
     Optional,
     Tuple,
 )
@@ -22,19 +27,36 @@ import kombu_batteries_included
 import pytest
 import sqlalchemy
 from flask import Flask, g
+from flask.testing import FlaskClient
 from flask_batteries_included.config import RealSqlDbConfig
 from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.sqldb import db
 from pytest_mock import MockFixture
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Load, ORMExecuteState, Session
+from sqlalchemy.pool import StaticPool
 
 from dhos_observations_api.models.sql.agg_observation_sets import AggObservationSets
+from dhos_observations_api.models.sql.observation import Observation
+from dhos_observations_api.models.sql.observation_metadata import ObservationMetaData
+from dhos_observations_api.models.sql.observation_set import (
+    ObservationSet,
+    _generate_uuids,
+)
 
 
 #####################################################
 # Configuration to use postgres started by tox-docker
 #####################################################
 def pytest_configure(config: Any) -> None:
+    # Declared here too so the marker is known when pytest-xdist is not installed.
+    config.addinivalue_line(
+        "markers", "xdist_group(name): run the marked tests on the same xdist worker"
+    )
+    config.addinivalue_line(
+        "markers",
+        "slow: timing-sensitive tests, deselected by tox and run by tox -e perf",
+    )
+
     for env_var, tox_var in [
         ("DATABASE_HOST", "POSTGRES_HOST"),
         ("DATABASE_PORT", "POSTGRES_5432_TCP_PORT"),
@@ -42,16 +64,53 @@ def pytest_configure(config: Any) -> None:
         if tox_var in os.environ:
             os.environ[env_var] = os.environ[tox_var]
 
-    import logging
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker and os.environ.get("DATABASE_PORT"):
+        # Give each pytest-xdist worker its own database so they can run in parallel.
+        base_database = os.environ["DATABASE_NAME"]
+        os.environ["DATABASE_NAME"] = f"{base_database}-{worker}"
+        _create_database(base_database, os.environ["DATABASE_NAME"])
+
+
+def pytest_sessionstart(session: Any) -> None:
+    # Import the app up front, once per worker, rather than on the first test.
+    import dhos_observations_api.app  # noqa: F401
 
     logging.getLogger("sqlalchemy.engine").setLevel(
         logging.DEBUG if os.environ.get("SQLALCHEMY_ECHO") else logging.WARNING
     )
 
 
+def _database_url(database: str) -> sqlalchemy.engine.URL:
+    return sqlalchemy.engine.URL.create(
+        "postgresql",
+        username=os.environ.get("DATABASE_USER"),
+        password=os.environ.get("DATABASE_PASSWORD"),
+        host=os.environ.get("DATABASE_HOST"),
+        port=int(os.environ["DATABASE_PORT"]),
+        database=database,
+    )
+
+
+def _create_database(base_database: str, database: str) -> None:
+    # CREATE DATABASE cannot run inside a transaction.
+    engine = sqlalchemy.create_engine(
+        _database_url(base_database), isolation_level="AUTOCOMMIT"
+    )
+    with engine.connect() as conn:
+        exists = conn.execute(
+            sqlalchemy.text("SELECT 1 FROM pg_database WHERE datname = :name"),
+            {"name": database},
+        ).scalar()
+        if not exists:
+            conn.execute(sqlalchemy.text(f'CREATE DATABASE "{database}"'))
+    engine.dispose()
+
+
 def pytest_report_header(config: Any) -> str:
     db_config = (
         f"{os.environ['DATABASE_HOST']}:{os.environ['DATABASE_PORT']}"
+        f"/{os.environ.get('DATABASE_NAME')}"
         if os.environ.get("DATABASE_PORT")
         else "Sqlite"
     )
@@ -66,33 +125,35 @@ def _wait_for_it(service: str, timeout: int = 30) -> None:
 
     friendly_name = f"{host}:{port}"
 
-    def _handle_timeout(signum: Any, frame: Any) -> NoReturn:
-        print(f"timeout occurred after waiting {timeout} seconds for {friendly_name}")
-        sys.exit(1)
-
     if timeout > 0:
-        signal.signal(signal.SIGALRM, _handle_timeout)
-        signal.alarm(timeout)
         print(f"waiting {timeout} seconds for {friendly_name}")
     else:
         print(f"waiting for {friendly_name} without a timeout")
 
-    t1 = time.time()
+    t1 = time.monotonic()
+    deadline: Optional[float] = t1 + timeout if timeout > 0 else None
 
-    while True:
+    while deadline is None or time.monotonic() < deadline:
+        wait = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s = sock.connect_ex((host, port))
-            if s == 0:
-                seconds = round(time.time() - t1)
-                print(f"{friendly_name} is available after {seconds} seconds")
-                break
-        except socket.gaierror:
+            with contextlib.closing(sock):
+                # Wait on a non-blocking connect so the service is seen as soon as
+                # it accepts, rather than at the next polling interval.
+                sock.setblocking(False)
+                sock.connect_ex((host, port))
+                _, writable, _ = select.select([], [sock], [], max(0.0, wait))
+                if writable and not sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                    seconds = round(time.monotonic() - t1, 2)
+                    print(f"{friendly_name} is available after {seconds} seconds")
+                    return
+        except OSError:
             pass
-        finally:
-            time.sleep(1)
+        # The connection was refused straight away, probe again shortly.
+        time.sleep(0.05)
 
-    signal.alarm(0)
+    print(f"timeout occurred after waiting {timeout} seconds for {friendly_name}")
+    sys.exit(1)
 
 
 #####################################################
@@ -100,178 +161,300 @@ def _wait_for_it(service: str, timeout: int = 30) -> None:
 #####################################################
 
 
-@pytest.fixture(scope="session")
-def session_app() -> Flask:
+_TEST_CONFIG: FrozenSet[Tuple[str, Any]] = frozenset(
+    {
+        "IGNORE_JWT_VALIDATION": False,
+        "UNITTESTING": True,
+        "ENVIRONMENT": "DEVELOPMENT",
+    }.items()
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _build_app(config: FrozenSet[Tuple[str, Any]]) -> Flask:
     import dhos_observations_api.app
 
     app = dhos_observations_api.app.create_app(testing=True)
     if os.environ.get("DATABASE_PORT"):
         # Override fbi use of sqlite to run tests with Postgres
         app.config.from_object(RealSqlDbConfig())
+        if os.environ.get("PYTEST_XDIST_WORKER"):
+            url = _database_url(os.environ["DATABASE_NAME"])
+            app.config["SQLALCHEMY_DATABASE_URI"] = url.render_as_string(
+                hide_password=False
+            )
+    else:
+        # A single in-memory sqlite connection backs the whole session, each
+        # xdist worker is its own process and so gets its own database.
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "connect_args": {"check_same_thread": False},
+            "poolclass": StaticPool,
+        }
+    app.config.update(config)
     return app
 
 
-@pytest.fixture
-def app(mocker: MockFixture, session_app: Flask) -> Flask:
+@pytest.fixture(scope="session")
+def session_app() -> Flask:
+    return _build_app(_TEST_CONFIG)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _patch_protected_route() -> Generator[None, None, None]:
     from flask_batteries_included.helpers.security import _ProtectedRoute
 
     def mock_claims(self: Any, verify: bool = True) -> Tuple:
         return g.jwt_claims, g.jwt_scopes
 
-    mocker.patch.object(_ProtectedRoute, "_retrieve_jwt_claims", mock_claims)
-    session_app.config["IGNORE_JWT_VALIDATION"] = False
-    session_app.config["UNITTESTING"] = True
-    session_app.config["ENVIRONMENT"] = "DEVELOPMENT"
+    mp = pytest.MonkeyPatch()
+    mp.setattr(_ProtectedRoute, "_retrieve_jwt_claims", mock_claims)
+    yield
+    mp.undo()
+
+
+@pytest.fixture(scope="session")
+def app(session_app: Flask) -> Flask:
+    # Session scoped as well, pytest-flask's per-test fixtures only need to see it.
     return session_app
 
 
-@pytest.fixture
-def app_context(app: Flask) -> Generator[None, None, None]:
-    with app.app_context():
-        yield
+@pytest.fixture(scope="session")
+def client(session_app: Flask) -> FlaskClient:
+    # Overrides pytest-flask's per-test client, the API is stateless and sets no
+    # cookies so one client serves the whole run.
+    return session_app.test_client()
 
 
-@pytest.fixture
-def mock_publish(mocker: MockFixture) -> Mock:
-    return mocker.patch.object(kombu_batteries_included, "publish_message")
+@pytest.fixture(scope="session")
+def authed_client(session_app: Flask) -> FlaskClient:
+    # Sends the bearer token on every request without a headers argument.
+    authed_client = session_app.test_client()
+    authed_client.environ_base["HTTP_AUTHORIZATION"] = "Bearer TOKEN"
+    return authed_client
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _session_app_context(session_app: Flask) -> Generator[None, None, None]:
+    # Pushed once for the whole run, request contexts pushed by pytest-flask reuse it.
+    ctx = session_app.app_context()
+    ctx.push()
+    yield
+    ctx.pop()
 
 
 @pytest.fixture(autouse=True)
-def uses_sql_database() -> None:
-    from flask_batteries_included.sqldb import db
+def _reset_app_globals(_session_app_context: None) -> Generator[None, None, None]:
+    yield
+    # g lives on the shared app context, so drop whatever the test left on it.
+    for name in list(vars(g)):
+        delattr(g, name)
+    # Nor is the scoped session removed, as popping a per-test context would.
+    db.session.remove()
+
+
+@pytest.fixture
+def app_context(_session_app_context: None) -> None:
+    # The pytest-dhos jwt fixtures ask for this, the session context already covers it.
+    pass
+
+
+@pytest.fixture(scope="module")
+def _publish_patcher() -> Generator[Mock, None, None]:
+    # Patched once per module, each test gets the same mock reset.
+    monkeypatch = pytest.MonkeyPatch()
+    publish_message = Mock()
+    monkeypatch.setattr(kombu_batteries_included, "publish_message", publish_message)
+    yield publish_message
+    monkeypatch.undo()
+
+
+@pytest.fixture
+def mock_publish(_publish_patcher: Mock) -> Mock:
+    _publish_patcher.reset_mock(return_value=True, side_effect=True)
+    return _publish_patcher
 
-    db.drop_all()
-    db.create_all()
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema(session_app: Flask) -> Generator[None, None, None]:
+    with session_app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield
+    with session_app.app_context():
+        db.session.remove()
+        db.drop_all()
 
 
 @pytest.fixture
+def uses_sql_database(session_app: Flask, _schema: None) -> Generator[None, None, None]:
+    yield
+    # Controller code commits and also runs raw SQL on other pooled connections,
+    # so rolling back a per-test transaction would not undo everything. Empty
+    # every table instead.
+    with session_app.app_context():
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+
+# The tables are emptied after every test, so the same UUIDs can be reused.
+_CLINICIAN_UUID = generate_uuid()
+_LOCATION_UUID = generate_uuid()
+_ENCOUNTER_UUID = generate_uuid()
+_PATIENT_UUID = generate_uuid()
+
+
+@pytest.fixture(scope="session")
 def clinician() -> str:
     """Override clinician fixture in pytest-dhos so that jwt_send_clinician_uuid doesn't hit neo4j"""
-    return generate_uuid()
+    return _CLINICIAN_UUID
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def location_uuid() -> str:
-    return generate_uuid()
+    return _LOCATION_UUID
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def encounter_uuid() -> str:
-    return generate_uuid()
+    return _ENCOUNTER_UUID
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def patient_uuid() -> str:
-    return generate_uuid()
+    return _PATIENT_UUID
 
 
 @pytest.fixture
-def jwt_contains_referring_device_id() -> str:
-    from flask import g
+def jwt_claims(request: Any) -> Generator[Dict, None, None]:
+    # Parametrize indirectly with the claims dict to use for the test.
+    missing = "jwt_claims" not in g
+    previous = g.get("jwt_claims")
+    g.jwt_claims = request.param
+    yield request.param
+    if missing:
+        g.pop("jwt_claims", None)
+    else:
+        g.jwt_claims = previous
+
 
+@pytest.fixture
+def jwt_contains_referring_device_id() -> Generator[str, None, None]:
     device_uuid = generate_uuid()
-    g.jwt_claims["referring_device_id"] = device_uuid
+    claims = g.jwt_claims
+    missing = "referring_device_id" not in claims
+    original = claims.get("referring_device_id")
+    claims["referring_device_id"] = device_uuid
+
+    yield device_uuid
 
-    return device_uuid
+    if missing:
+        claims.pop("referring_device_id", None)
+    else:
+        claims["referring_device_id"] = original
+
+
+_PATIENT_OBS_DATA = [
+    {
+        "patient_id": "1",
+        "record_time": "1970-01-03T00:00:12.000Z",
+        "observations": [
+            {
+                "observation_type": "temp",
+                "observation_value": 37.5,
+                "measured_time": "1970-01-01T00:00:00.000Z",
+            }
+        ],
+    },
+    {
+        "patient_id": "1",
+        "record_time": "1970-01-03T00:00:10.000Z",
+        "observations": [
+            {
+                "observation_type": "temp",
+                "observation_value": 37.5,
+                "measured_time": "1970-01-01T00:00:01.000Z",
+            }
+        ],
+    },
+    {
+        "patient_id": "1",
+        "record_time": "1970-01-03T00:00:20.000Z",
+        "observations": [
+            {
+                "observation_type": "temp",
+                "observation_value": 37.5,
+                "measured_time": "1970-01-01T00:00:02.000Z",
+            }
+        ],
+    },
+]
+
+_OBS_DATA = [
+    {
+        "location": "location_uuid",
+        "encounter_id": "1",
+        "record_time": "1970-01-03T00:00:12.000Z",
+        "score_system": "news2",
+        "spo2_scale": 1,
+        "observations": [
+            {
+                "observation_type": "spo2",
+                "measured_time": "1970-01-01T00:00:00.000Z",
+            }
+        ],
+    },
+    {
+        "location": "location_uuid",
+        "encounter_id": "2",
+        "record_time": "1970-01-03T00:00:10.000Z",
+        "score_system": "news2",
+        "spo2_scale": 1,
+        "observations": [
+            {
+                "observation_type": "spo2",
+                "measured_time": "1970-01-01T00:00:01.000Z",
+            }
+        ],
+    },
+    {
+        "location": "location_uuid",
+        "encounter_id": "3",
+        "record_time": "1970-01-03T00:00:20.000Z",
+        "score_system": "news2",
+        "spo2_scale": 1,
+        "observations": [
+            {
+                "observation_type": "spo2",
+                "measured_time": "1970-01-01T00:00:02.000Z",
+            }
+        ],
+    },
+]
 
 
 @pytest.fixture()
 def mocked_get_patient_observations(mocker: MockFixture) -> Mock:
     """Fixture to mock dhos_adapter.publish"""
-
-    my_data = [
-        {
-            "patient_id": "1",
-            "record_time": "1970-01-03T00:00:12.000Z",
-            "observations": [
-                {
-                    "observation_type": "temp",
-                    "observation_value": 37.5,
-                    "measured_time": "1970-01-01T00:00:00.000Z",
-                }
-            ],
-        },
-        {
-            "patient_id": "1",
-            "record_time": "1970-01-03T00:00:10.000Z",
-            "observations": [
-                {
-                    "observation_type": "temp",
-                    "observation_value": 37.5,
-                    "measured_time": "1970-01-01T00:00:01.000Z",
-                }
-            ],
-        },
-        {
-            "patient_id": "1",
-            "record_time": "1970-01-03T00:00:20.000Z",
-            "observations": [
-                {
-                    "observation_type": "temp",
-                    "observation_value": 37.5,
-                    "measured_time": "1970-01-01T00:00:02.000Z",
-                }
-            ],
-        },
-    ]
     return mocker.patch(
         "dhos_observations_api.blueprint_api.controller.get_observation_sets_for_patient",
-        return_value=my_data,
+        return_value=_PATIENT_OBS_DATA,
     )
 
 
 @pytest.fixture()
 def mocked_get_observations(mocker: MockFixture) -> Mock:
     """Fixture to mock dhos_adapter.publish"""
-
-    my_data = [
-        {
-            "location": "location_uuid",
-            "encounter_id": "1",
-            "record_time": "1970-01-03T00:00:12.000Z",
-            "score_system": "news2",
-            "spo2_scale": 1,
-            "observations": [
-                {
-                    "observation_type": "spo2",
-                    "measured_time": "1970-01-01T00:00:00.000Z",
-                }
-            ],
-        },
-        {
-            "location": "location_uuid",
-            "encounter_id": "2",
-            "record_time": "1970-01-03T00:00:10.000Z",
-            "score_system": "news2",
-            "spo2_scale": 1,
-            "observations": [
-                {
-                    "observation_type": "spo2",
-                    "measured_time": "1970-01-01T00:00:01.000Z",
-                }
-            ],
-        },
-        {
-            "location": "location_uuid",
-            "encounter_id": "3",
-            "record_time": "1970-01-03T00:00:20.000Z",
-            "score_system": "news2",
-            "spo2_scale": 1,
-            "observations": [
-                {
-                    "observation_type": "spo2",
-                    "measured_time": "1970-01-01T00:00:02.000Z",
-                }
-            ],
-        },
-    ]
     return mocker.patch(
         "dhos_observations_api.blueprint_api.controller.get_observation_sets_by_locations_and_date_range",
-        return_value=my_data,
+        return_value=_OBS_DATA,
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def aggregate_observation_sets() -> Dict:
     return {
         "late": 8,
@@ -304,7 +487,7 @@ def aggregate_observation_sets() -> Dict:
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def aggregate_missing_observation_sets() -> Dict:
     return {
         "total_obs_sets": 30,
@@ -332,7 +515,7 @@ def aggregate_missing_observation_sets() -> Dict:
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def aggregate_observation_intervals() -> Dict:
     risk: Dict = {
         "low": {
@@ -359,85 +542,93 @@ def aggregate_observation_intervals() -> Dict:
     return {"risk": {**risk}, "location_uuid_1": {"risk": {**risk}}}
 
 
+_AGG_ROW_2021_01_01 = dict(
+    record_day="2021-01-01",
+    location_id="location_uuid_1",
+    score_severity="low",
+    all_obs_sets=1220,
+    late_obs_sets=0,
+    missing_obs=0,
+    o2_therapy_status=0,
+    heart_rate=0,
+    spo2=0,
+    temperature=0,
+    diastolic_blood_pressure=0,
+    respiratory_rate=0,
+    consciousness_acvpu=0,
+    systolic_blood_pressure=0,
+    nurse_concern=0,
+    minus60=120,
+    minus45_59=90,
+    minus30_44=80,
+    minus15_29=70,
+    minus0_14=80,
+    plus1_15=90,
+    plus16_30=100,
+    plus31_45=110,
+    plus46_60=100,
+    plus61_75=90,
+    plus76_90=70,
+    plus91_105=60,
+    plus106_120=50,
+    plus121_135=40,
+    plus136_150=30,
+    plus151_165=20,
+    plus166_180=10,
+    plus180=50,
+)
+
+_AGG_ROW_2021_01_02 = dict(
+    record_day="2021-01-02",
+    location_id="location_uuid_1",
+    score_severity="low",
+    all_obs_sets=1220,
+    late_obs_sets=0,
+    missing_obs=0,
+    o2_therapy_status=0,
+    heart_rate=0,
+    spo2=0,
+    temperature=0,
+    diastolic_blood_pressure=0,
+    respiratory_rate=0,
+    consciousness_acvpu=0,
+    systolic_blood_pressure=0,
+    nurse_concern=0,
+    minus60=1,
+    minus45_59=1,
+    minus30_44=1,
+    minus15_29=1,
+    minus0_14=1,
+    plus1_15=1,
+    plus16_30=1,
+    plus31_45=1,
+    plus46_60=1,
+    plus61_75=1,
+    plus76_90=1,
+    plus91_105=1,
+    plus106_120=1,
+    plus121_135=1,
+    plus136_150=1,
+    plus151_165=1,
+    plus166_180=1,
+    plus180=1,
+)
+
+
 @pytest.fixture
-def create_aggregate_observation_intervals() -> str:
-    obj1 = AggObservationSets(
-        record_day="2021-01-01",
-        location_id="location_uuid_1",
-        score_severity="low",
-        all_obs_sets=1220,
-        late_obs_sets=0,
-        missing_obs=0,
-        o2_therapy_status=0,
-        heart_rate=0,
-        spo2=0,
-        temperature=0,
-        diastolic_blood_pressure=0,
-        respiratory_rate=0,
-        consciousness_acvpu=0,
-        systolic_blood_pressure=0,
-        nurse_concern=0,
-        minus60=120,
-        minus45_59=90,
-        minus30_44=80,
-        minus15_29=70,
-        minus0_14=80,
-        plus1_15=90,
-        plus16_30=100,
-        plus31_45=110,
-        plus46_60=100,
-        plus61_75=90,
-        plus76_90=70,
-        plus91_105=60,
-        plus106_120=50,
-        plus121_135=40,
-        plus136_150=30,
-        plus151_165=20,
-        plus166_180=10,
-        plus180=50,
+def create_aggregate_observation_intervals(uses_sql_database: None) -> str:
+    # Core executemany insert, the tests only need the rows to be present.
+    db.session.execute(
+        sqlalchemy.insert(AggObservationSets).values(
+            created_by_="unittest", modified_by_="unittest"
+        ),
+        [_AGG_ROW_2021_01_01, _AGG_ROW_2021_01_02],
     )
-    obj2 = AggObservationSets(
-        record_day="2021-01-02",
-        location_id="location_uuid_1",
-        score_severity="low",
-        all_obs_sets=1220,
-        late_obs_sets=0,
-        missing_obs=0,
-        o2_therapy_status=0,
-        heart_rate=0,
-        spo2=0,
-        temperature=0,
-        diastolic_blood_pressure=0,
-        respiratory_rate=0,
-        consciousness_acvpu=0,
-        systolic_blood_pressure=0,
-        nurse_concern=0,
-        minus60=1,
-        minus45_59=1,
-        minus30_44=1,
-        minus15_29=1,
-        minus0_14=1,
-        plus1_15=1,
-        plus16_30=1,
-        plus31_45=1,
-        plus46_60=1,
-        plus61_75=1,
-        plus76_90=1,
-        plus91_105=1,
-        plus106_120=1,
-        plus121_135=1,
-        plus136_150=1,
-        plus151_165=1,
-        plus166_180=1,
-        plus180=1,
-    )
-    db.session.add(obj1)
-    db.session.add(obj2)
     db.session.commit()
     return "created"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def agg_observation_sets_by_month() -> dict:
     return {
         "2021-09": {
@@ -479,7 +670,7 @@ def agg_observation_sets_by_month() -> dict:
     }
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def agg_observation_sets_by_location_month() -> dict:
     return {
         "location_uuid_1": {
@@ -526,6 +717,7 @@ def agg_observation_sets_by_location_month() -> dict:
 class DBStatementCounter(object):
     def __init__(self, limit: int = None) -> None:
         self.clauses: list[sqlalchemy.sql.ClauseElement] = []
+        self.statements: list[Tuple[str, Any]] = []
         self.limit = limit
 
     @property
@@ -552,6 +744,31 @@ class DBStatementCounter(object):
                 len(self.clauses) <= self.limit
             ), f"Too many SQL statements (limit was {self.limit})"
 
+    def cursor_callback(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        if "SAVEPOINT" in statement:
+            return
+        # Collapse the newlines and indentation SQLAlchemy compiles in.
+        self.statements.append((" ".join(statement.split()), parameters))
+
+    def assert_shape(self, prefix: str, *fragments: str) -> None:
+        """
+        Asserts exactly one SQL statement reached the database, that it starts
+        with prefix and that it contains every fragment.
+        """
+        assert len(self.statements) == 1, [s for s, _ in self.statements]
+        statement = self.statements[0][0]
+        assert statement.startswith(prefix), statement
+        for fragment in fragments:
+            assert fragment in statement, statement
+
 
 @contextlib.contextmanager
 def db_statement_counter(
@@ -561,11 +778,14 @@ def db_statement_counter(
         session = db.session
     counter = DBStatementCounter(limit=limit)
     cb = counter.callback
+    cursor_cb = counter.cursor_callback
     sqlalchemy.event.listen(db.engine, "before_execute", cb)
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", cursor_cb)
     try:
         yield counter
     finally:
         sqlalchemy.event.remove(db.engine, "before_execute", cb)
+        sqlalchemy.event.remove(db.engine, "before_cursor_execute", cursor_cb)
 
 
 @pytest.fixture
@@ -573,3 +793,211 @@ def statement_counter() -> Callable[
     [Optional[int], Optional[Session]], ContextManager[DBStatementCounter]
 ]:
     return db_statement_counter
+
+
+def _raiseload_obs_set_relationships(orm_execute_state: ORMExecuteState) -> None:
+    if (
+        orm_execute_state.is_select
+        and not orm_execute_state.is_column_load
+        and not orm_execute_state.is_relationship_load
+        and orm_execute_state.bind_mapper is sqlalchemy.inspect(ObservationSet)
+    ):
+        # Only the obs set's own relationships, the joined metadata on
+        # Observation must keep loading as mapped.
+        orm_execute_state.statement = orm_execute_state.statement.options(
+            Load(ObservationSet).raiseload("*", sql_only=True)
+        )
+
+
+@pytest.fixture
+def raise_on_lazy_load(uses_sql_database: None) -> Generator[None, None, None]:
+    """
+    Makes ObservationSet relationships that a query did not eager load raise
+    rather than lazy load, so an N+1 in the controller fails the test. Objects
+    are not expired on commit, so reading them back needs no reload.
+    """
+    session = db.session()
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    sqlalchemy.event.listen(Session, "do_orm_execute", _raiseload_obs_set_relationships)
+    yield
+    sqlalchemy.event.remove(Session, "do_orm_execute", _raiseload_obs_set_relationships)
+    session.expire_on_commit = expire_on_commit
+
+
+def _insert_rows(table: sqlalchemy.Table, rows: List[Dict]) -> None:
+    # An executemany needs the same keys in every row, so group rows by shape.
+    by_shape: Dict[FrozenSet[str], List[Dict]] = {}
+    for row in rows:
+        by_shape.setdefault(frozenset(row), []).append(row)
+    for shaped_rows in by_shape.values():
+        db.session.execute(table.insert(), shaped_rows)
+
+
+def _bulk_insert_obs_sets(obs_sets: Iterable[Dict]) -> List[str]:
+    """
+    Inserts obs sets, given as the keyword arguments ObservationSet.new takes,
+    with their observations and metadata using Core executemany INSERTs, one per
+    table and row shape. Skips the ORM unit of work and the controller, so
+    nothing is scored or published, and does not commit.
+    """
+    obs_sets = list(obs_sets)
+    observations = [obs for obs_set in obs_sets for obs in obs_set["observations"]]
+    uuids = _generate_uuids(len(obs_sets) + 2 * len(observations))
+    now = datetime.utcnow()
+    audit = {
+        "created": now,
+        "created_by_": "unittest",
+        "modified": now,
+        "modified_by_": "unittest",
+    }
+    obs_set_rows: List[Dict] = []
+    obs_rows: List[Dict] = []
+    metadata_rows: List[Dict] = []
+    for obs_set in obs_sets:
+        obs_set_row = {"uuid": next(uuids), "spo2_scale": 1, **obs_set, **audit}
+        del obs_set_row["observations"]
+        obs_set_rows.append(obs_set_row)
+        for obs in obs_set["observations"]:
+            obs_row: Dict[str, Any] = {
+                "uuid": next(uuids),
+                "observation_set_uuid": obs_set_row["uuid"],
+                "patient_refused": False,
+                **obs,
+                **audit,
+            }
+            metadata = obs_row.pop("observation_metadata", None)
+            obs_rows.append(obs_row)
+            if metadata:
+                metadata_rows.append(
+                    {
+                        "uuid": next(uuids),
+                        "observation_uuid": obs_row["uuid"],
+                        **metadata,
+                        **audit,
+                    }
+                )
+    _insert_rows(ObservationSet.__table__, obs_set_rows)
+    _insert_rows(Observation.__table__, obs_rows)
+    _insert_rows(ObservationMetaData.__table__, metadata_rows)
+    return [row["uuid"] for row in obs_set_rows]
+
+
+def _bulk_make_obs_sets(
+    encounter_ids: Iterable[str],
+    per_encounter: int,
+    record_time_fn: Callable[[int], datetime],
+) -> List[str]:
+    """
+    Inserts and commits per_encounter observation sets, each holding one
+    temperature observation, for every encounter.
+    """
+    obs_sets: List[Dict] = []
+    for encounter_id in encounter_ids:
+        for i in range(per_encounter):
+            record_time = record_time_fn(i)
+            obs_sets.append(
+                {
+                    "encounter_id": encounter_id,
+                    "record_time": record_time,
+                    "score_system": "news2",
+                    "observations": [
+                        {
+                            "observation_type": "temperature",
+                            "observation_unit": "celsius",
+                            "observation_value": 35,
+                            "measured_time": record_time,
+                        }
+                    ],
+                }
+            )
+    return _bulk_commit_obs_sets(obs_sets)
+
+
+def _bulk_commit_obs_sets(obs_sets: Iterable[Dict]) -> List[str]:
+    uuids = _bulk_insert_obs_sets(obs_sets)
+    db.session.commit()
+    return uuids
+
+
+@pytest.fixture
+def bulk_insert_obs_sets(
+    uses_sql_database: None,
+) -> Callable[[Iterable[Dict]], List[str]]:
+    return _bulk_insert_obs_sets
+
+
+@pytest.fixture
+def bulk_make_obs_sets(
+    uses_sql_database: None,
+) -> Callable[[Iterable[str], int, Callable[[int], datetime]], List[str]]:
+    return _bulk_make_obs_sets
+
+
+_LATEST_SEED_START = datetime(2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def latest_obs_seed(uses_sql_database: None) -> Tuple[List[str], datetime]:
+    """
+    Seeds 100 encounters with 10 obs sets each, one second apart, and returns
+    the encounter UUIDs with the latest record time.
+    """
+    encounter_uuids = list(_generate_uuids(100))
+    _bulk_make_obs_sets(
+        encounter_uuids,
+        10,
+        lambda i: _LATEST_SEED_START + timedelta(seconds=i),
+    )
+    return encounter_uuids, _LATEST_SEED_START + timedelta(seconds=9)
+
+
+@pytest.fixture
+def location_obs_seed(uses_sql_database: None) -> Tuple[str, str, str]:
+    """
+    Seeds three locations and returns their UUIDs. The first has five o2
+    therapy obs sets a day apart from 2019-01-01, the other two have five empty
+    obs sets a day apart from 1970-01-01 for an encounter each.
+    """
+    o2_location, location_1, location_2 = _generate_uuids(3)
+    o2_encounter, encounter_1, encounter_2 = _generate_uuids(3)
+    obs_sets: List[Dict] = []
+    for i in range(5):
+        record_time = datetime(2019, 1, i + 1, 11, 59, 20 + i, tzinfo=timezone.utc)
+        obs_sets.append(
+            {
+                "encounter_id": o2_encounter,
+                "location": o2_location,
+                "record_time": record_time,
+                "score_system": "news2",
+                "observations": [
+                    {
+                        "observation_type": "o2_therapy_status",
+                        "observation_unit": "L/min",
+                        "measured_time": record_time,
+                        "observation_value": 22,
+                        "observation_metadata": {
+                            "mask": "High Flow",
+                            "mask_percent": 35,
+                        },
+                    }
+                ],
+            }
+        )
+        for encounter_id, location in (
+            (encounter_1, location_1),
+            (encounter_2, location_2),
+        ):
+            obs_sets.append(
+                {
+                    "encounter_id": encounter_id,
+                    "location": location,
+                    "record_time": datetime(
+                        1970, 1, i + 1, 0, 0, 1, tzinfo=timezone.utc
+                    ),
+                    "score_system": "news2",
+                    "observations": [],
+                }
+            )
+    _bulk_insert_obs_sets(obs_sets)
+    return o2_location, location_1, location_2
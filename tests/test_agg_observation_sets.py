@@ -0,0 +1,167 @@
+import importlib.util
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, Generator, Iterable, List, Optional
+
+import pytest
+from flask_batteries_included.sqldb import db
+from sqlalchemy import text
+
+from dhos_observations_api.blueprint_api import controller
+from dhos_observations_api.models.sql.agg_observation_sets import AggObservationSets
+
+_MIGRATION = (
+    Path(__file__).parent.parent
+    / "migrations"
+    / "versions"
+    / "b3d9e1f07a62_agg_obs_incremental.py"
+)
+_DAY_1 = datetime(2021, 10, 5, 9, 0, tzinfo=timezone.utc)
+_DAY_2 = datetime(2021, 10, 6, 9, 0, tzinfo=timezone.utc)
+_ORDER_BY = "ORDER BY record_day, location_id, score_severity"
+
+
+def _load_migration() -> ModuleType:
+    spec = importlib.util.spec_from_file_location("agg_obs_incremental", _MIGRATION)
+    migration = importlib.util.module_from_spec(spec)  # type:ignore
+    spec.loader.exec_module(migration)  # type:ignore
+    return migration
+
+
+@pytest.fixture
+def agg_migration(uses_sql_database: None) -> Generator[ModuleType, None, None]:
+    """
+    Swaps the agg_observation_sets table that db.create_all() made for the one the
+    migration makes, along with the triggers and refresh function that fill it.
+    """
+    migration = _load_migration()
+    with db.engine.begin() as conn:
+        AggObservationSets.__table__.drop(conn)
+        conn.exec_driver_sql(migration.AGG_OBSERVATION_SETS_TABLE)
+        for statement in migration.INCREMENTAL_REFRESH_DDL:
+            conn.exec_driver_sql(statement)
+    yield migration
+    db.session.remove()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("DROP FUNCTION refresh_agg_observation_sets()")
+        conn.exec_driver_sql(
+            "DROP TRIGGER agg_observation_sets_update ON observation_set"
+        )
+        conn.exec_driver_sql(
+            "DROP TRIGGER agg_observation_sets_insert_delete ON observation_set"
+        )
+        conn.exec_driver_sql("DROP FUNCTION agg_observation_sets_mark_dirty()")
+        conn.exec_driver_sql("DROP TABLE agg_observation_sets_dirty")
+        conn.exec_driver_sql("DROP TABLE agg_observation_sets")
+        AggObservationSets.__table__.create(conn)
+
+
+def _obs_set(
+    record_time: datetime,
+    location: Optional[str],
+    score_severity: Optional[str],
+    mins_late: Optional[int],
+    observation_types: Iterable[str] = ("heart_rate", "spo2"),
+    is_partial: bool = False,
+) -> Dict:
+    return {
+        "encounter_id": "encounter_uuid_1",
+        "record_time": record_time,
+        "score_system": "news2",
+        "location": location,
+        "score_severity": score_severity,
+        "mins_late": mins_late,
+        "is_partial": is_partial,
+        "observations": [
+            {
+                "observation_type": observation_type,
+                "observation_value": 1,
+                "measured_time": record_time,
+            }
+            for observation_type in observation_types
+        ],
+    }
+
+
+def _fetch(sql: str) -> List[Dict]:
+    return [dict(row._mapping) for row in db.session.execute(text(sql))]
+
+
+def _assert_matches_view(migration: ModuleType) -> List[Dict]:
+    controller.refresh_agg_observation_sets()
+    assert _fetch("SELECT * FROM agg_observation_sets_dirty") == []
+    rows = _fetch(f"SELECT * FROM agg_observation_sets {_ORDER_BY}")
+    expected = _fetch(
+        f"SELECT * FROM ({migration.MATERIALIZED_VIEW_QUERY}) v {_ORDER_BY}"
+    )
+    assert rows == expected
+    return rows
+
+
+@pytest.mark.usefixtures("app")
+class TestAggObservationSets:
+    def test_refresh_matches_materialized_view(
+        self,
+        agg_migration: ModuleType,
+        bulk_insert_obs_sets: Callable[[Iterable[Dict]], List[str]],
+    ) -> None:
+        late, moved, unscored, deleted, _, _, _ = bulk_insert_obs_sets(
+            [
+                _obs_set(_DAY_1, "location_1", "low", 5),
+                _obs_set(_DAY_1, "location_1", "low", -20, ["temperature"]),
+                _obs_set(_DAY_1, "location_1", "low", 0, is_partial=True),
+                _obs_set(_DAY_2, "location_2", "high", 95),
+                _obs_set(_DAY_1, None, "medium", None, []),
+                _obs_set(_DAY_2, "location_1", None, 200, ["nurse_concern"]),
+                _obs_set(_DAY_2, None, None, -70),
+            ]
+        )
+        db.session.commit()
+        # One queued row per bucket, NULL buckets included.
+        assert _fetch("SELECT count(*) FROM agg_observation_sets_dirty") == [
+            {"count": 5}
+        ]
+
+        rows = _assert_matches_view(agg_migration)
+        assert len(rows) == 5
+        assert any(row["location_id"] is None for row in rows)
+        assert any(row["score_severity"] is None for row in rows)
+
+        # Not an aggregated column, so nothing is queued.
+        db.session.execute(
+            text("UPDATE observation_set SET score_string = '1' WHERE uuid = :uuid"),
+            {"uuid": late},
+        )
+        db.session.commit()
+        assert _fetch("SELECT * FROM agg_observation_sets_dirty") == []
+
+        db.session.execute(
+            text("UPDATE observation_set SET mins_late = 50 WHERE uuid = :uuid"),
+            {"uuid": late},
+        )
+        db.session.execute(
+            text("UPDATE observation_set SET location = NULL WHERE uuid = :uuid"),
+            {"uuid": moved},
+        )
+        db.session.execute(
+            text("UPDATE observation_set SET score_severity = NULL WHERE uuid = :uuid"),
+            {"uuid": unscored},
+        )
+        db.session.execute(
+            text("DELETE FROM observation WHERE observation_set_uuid = :uuid"),
+            {"uuid": deleted},
+        )
+        db.session.execute(
+            text("DELETE FROM observation_set WHERE uuid = :uuid"), {"uuid": deleted}
+        )
+        db.session.commit()
+
+        rows = _assert_matches_view(agg_migration)
+        # The deleted obs set was the only one in its bucket, so that row is gone.
+        assert {(row["record_day"], row["location_id"]) for row in rows} == {
+            ("2021-10-05", "location_1"),
+            ("2021-10-05", None),
+            ("2021-10-06", "location_1"),
+            ("2021-10-06", None),
+        }
@@ -1,7 +1,7 @@
+import itertools
 import time
-import uuid
-from datetime import datetime, timedelta, timezone
-from typing import Callable, Dict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
 from unittest.mock import Mock
 
 import pytest
@@ -9,502 +9,179 @@ from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.timestamp import (
     parse_iso8601_to_datetime_typesafe,
 )
-from flask_batteries_included.sqldb import db
 from pytest_mock import MockFixture
 
 from dhos_observations_api.blueprint_api import controller
 from dhos_observations_api.models.api_spec import ObservationSetRequest
-from dhos_observations_api.models.sql.observation_set import ObservationSet
+
+T_2021_10_05_0910 = parse_iso8601_to_datetime_typesafe("2021-10-05T09:10:00.000Z")
+T_2021_10_05_1000 = parse_iso8601_to_datetime_typesafe("2021-10-05T10:00:00.000Z")
+T_2021_10_05_1120 = parse_iso8601_to_datetime_typesafe("2021-10-05T11:20:00.000Z")
+T_2021_10_05_1220 = parse_iso8601_to_datetime_typesafe("2021-10-05T12:20:00.000Z")
+
+_JAN_2021 = {"start_date": "2021-01-01", "end_date": "2021-02-01"}
+_AUG_SEP_2021 = {"start_date": "2021-08-01", "end_date": "2021-10-01"}
+
+# Rows as returned by the aggregate SQL, shared by the tests that mock it out.
+_ON_TIME_ROWS = (
+    ("location_uuid_1", "2021-01-01", "low", 9, 1),
+    ("location_uuid_1", "2021-01-01", "medium", 8, 2),
+    ("location_uuid_1", "2021-01-01", "high", 5, 5),
+)
+_MISSING_ROWS = (("location_uuid_1", 30, 5, 27, 27, 29, 25, 30, 29, 26, 30),)
+_TIME_INTERVAL_ROWS = (
+    ("location_uuid_1", "low", 121, 91, 81, 71, 81, 91, 101, 111, 101, 91, 71, 61)
+    + (51, 41, 31, 21, 11, 51),
+)
+_AGG_BY_MONTH_ROWS = (
+    ("2021-09", "low", 25, 5, 10, 24, 24, 23, 23, 21, 21, 17, 17, 17),
+    ("2021-09", "low-medium", 25, 5, 10, 24, 24, 23, 23, 21, 21, 17, 17, 17),
+    ("2021-09", "medium", 25, 5, 10, 24, 24, 23, 23, 21, 21, 17, 17, 17),
+    ("2021-09", "high", 25, 5, 10, 24, 24, 23, 23, 21, 21, 17, 17, 17),
+    ("2021-08", "low", 35, 5, 20, 33, 33, 31, 31, 27, 27, 19, 19, 19),
+    ("2021-08", "low-medium", 35, 10, 20, 33, 33, 31, 31, 27, 27, 19, 19, 19),
+    ("2021-08", "medium", 35, 10, 20, 33, 33, 31, 31, 27, 27, 19, 19, 19),
+    ("2021-08", "high", 35, 10, 20, 33, 33, 31, 31, 27, 27, 19, 19, 19),
+)
+_AGG_BY_LOCATION_MONTH_ROWS = tuple(
+    ("location_uuid_1", *row) for row in _AGG_BY_MONTH_ROWS
+)
 
 
 @pytest.mark.usefixtures("app", "uses_sql_database")
 class TestController:
-    @pytest.mark.parametrize("suppress_obs_publish", [True, False])
-    @pytest.mark.parametrize(
-        ["obs_set_time", "obs_set_spo2_scale"],
-        [
-            ("2019-01-08T00:00:00.000Z", 2),
-            ("2019-01-08T00:00:00.000Z", 1),
-            ("2019-01-06T00:00:00.000Z", 2),
-            ("2019-01-06T00:00:00.000Z", 1),
-            ("2019-01-04T00:00:00.000Z", 2),
-            ("2019-01-04T00:00:00.000Z", 1),
-            ("2019-01-02T00:00:00.000Z", 2),
-            ("2019-01-02T00:00:00.000Z", 1),
-            ("1970-01-01T00:00:00.000Z", 1),
-            ("1970-01-01T00:00:00.000Z", 2),
-        ],
-    )
     def test_create_observation_set_spo2_scale_changed_with_history(
         self,
-        mocker: MockFixture,
         encounter_uuid: str,
         location_uuid: str,
-        obs_set_time: str,
-        obs_set_spo2_scale: int,
         mock_publish: Mock,
-        suppress_obs_publish: bool,
     ) -> None:
-        obs_set: ObservationSetRequest.Meta.Dict = {
-            "encounter_id": encounter_uuid,
-            "location": location_uuid,
-            "record_time": parse_iso8601_to_datetime_typesafe(obs_set_time),
-            "score_system": "news2",
-            "spo2_scale": obs_set_spo2_scale,
-            "observations": [
-                {
-                    "observation_type": "spo2",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(obs_set_time),
-                    "observation_value": 97,
-                }
+        # The cases run in one test so they share a single fixture setup, and the
+        # obs sets created by earlier cases form the history for later ones.
+        for obs_set_time, obs_set_spo2_scale, suppress_obs_publish in itertools.product(
+            [
+                "2019-01-08T00:00:00.000Z",
+                "2019-01-06T00:00:00.000Z",
+                "2019-01-04T00:00:00.000Z",
+                "2019-01-02T00:00:00.000Z",
+                "1970-01-01T00:00:00.000Z",
             ],
-        }
-        result = controller.create_observation_set(
-            obs_set, suppress_obs_publish=suppress_obs_publish
-        )
-        assert result["encounter_id"] == encounter_uuid
-        assert result["spo2_scale"] == obs_set_spo2_scale
-        assert "spo2_scale_has_changed" not in result
-        assert result["location"] == location_uuid
-
-        assert mock_publish.call_count == (1 if suppress_obs_publish else 3)
-
-    def test_retrieve_observation_count_for_encounter_ids(
-        self, statement_counter: Callable
-    ) -> None:
-        encounter_1 = generate_uuid()
-        for i in range(5):
-            ObservationSet.new(
-                encounter_id=encounter_1,
-                score_system="news2",
-                record_time=datetime.now(),
-                observations=[
+            [2, 1],
+            [True, False],
+        ):
+            mock_publish.reset_mock()
+            record_time = parse_iso8601_to_datetime_typesafe(obs_set_time)
+            obs_set: ObservationSetRequest.Meta.Dict = {
+                "encounter_id": encounter_uuid,
+                "location": location_uuid,
+                "record_time": record_time,
+                "score_system": "news2",
+                "spo2_scale": obs_set_spo2_scale,
+                "observations": [
                     {
-                        "observation_type": "o2_therapy_status",
-                        "patient_refused": False,
-                        "observation_unit": "L/min",
-                        "measured_time": datetime.now(),
-                        "observation_value": 22,
-                        "observation_metadata": {
-                            "mask": "High Flow",
-                            "mask_percent": 35,
-                        },
+                        "observation_type": "spo2",
+                        "measured_time": record_time,
+                        "observation_value": 97,
                     }
                 ],
+            }
+            result = controller.create_observation_set(
+                obs_set, suppress_obs_publish=suppress_obs_publish
             )
+            assert result["encounter_id"] == encounter_uuid
+            assert result["spo2_scale"] == obs_set_spo2_scale
+            assert "spo2_scale_has_changed" not in result
+            assert result["location"] == location_uuid
 
-        encounter_2 = generate_uuid()
-        for i in range(3):
-            ObservationSet.new(
-                encounter_id=encounter_2,
-                score_system="news2",
-                record_time=datetime.now(),
-                observations=[
-                    {
-                        "observation_type": "o2_therapy_status",
-                        "patient_refused": False,
-                        "observation_unit": "L/min",
-                        "measured_time": datetime.now(),
-                        "observation_value": 22,
-                        "observation_metadata": {
-                            "mask": "High Flow",
-                            "mask_percent": 35,
-                        },
-                    }
-                ],
+            assert mock_publish.call_count == (1 if suppress_obs_publish else 3), (
+                obs_set_time,
+                obs_set_spo2_scale,
+                suppress_obs_publish,
             )
 
-        db.session.commit()
+    def test_retrieve_observation_count_for_encounter_ids(
+        self, bulk_make_obs_sets: Callable, statement_counter: Callable
+    ) -> None:
+        encounter_1 = generate_uuid()
+        encounter_2 = generate_uuid()
+        now = datetime.now(timezone.utc)
+        bulk_make_obs_sets([encounter_1], 5, lambda i: now)
+        bulk_make_obs_sets([encounter_2], 3, lambda i: now)
+
         encounter_3 = generate_uuid()
-        with statement_counter(limit=1):
+        with statement_counter(limit=1) as counter:
             result = controller.retrieve_observation_count_for_encounter_ids(
                 [encounter_1, encounter_2, encounter_3]
             )
+        # One grouped count for all the encounters, not a COUNT per encounter.
+        counter.assert_shape(
+            "SELECT observation_set.encounter_id",
+            "count(observation_set.encounter_id)",
+            "GROUP BY observation_set.encounter_id",
+        )
         assert result == {encounter_1: 5, encounter_2: 3, encounter_3: 0}
 
     def test_refresh_agg_observation_sets(
         self,
         mocker: MockFixture,
     ) -> None:
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-        )
+        mocker.patch.object(controller.db.engine, "execute")
         result = controller.refresh_agg_observation_sets()
         assert result["time_taken"] is not None
 
-    def test_on_time_observation_sets(
-        self, mocker: MockFixture, aggregate_observation_sets: Dict
-    ) -> None:
-        obs_sets = [
-            ["location_uuid_1", "2021-01-01", "low", 9, 1],
-            ["location_uuid_1", "2021-01-01", "medium", 8, 2],
-            ["location_uuid_1", "2021-01-01", "high", 5, 5],
-        ]
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-            return_value=obs_sets,
-        )
-        result = controller.on_time_observation_sets(
-            start_date="2021-01-01",
-            end_date="2021-02-01",
-            location_uuids=["location_uuid_1"],
-        )
-        assert result == aggregate_observation_sets
-
-    def test_missing_observation_sets(
-        self, mocker: MockFixture, aggregate_missing_observation_sets: Dict
-    ) -> None:
-        obs_sets = [
-            ["location_uuid_1", 30, 5, 27, 27, 29, 25, 30, 29, 26, 30],
-        ]
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-            return_value=obs_sets,
-        )
-        result = controller.missing_observation_sets(
-            start_date="2021-01-01",
-            end_date="2021-02-01",
-            location_uuids=["location_uuid_1"],
-        )
-        assert result == aggregate_missing_observation_sets
-
-    def test_observation_sets_time_intervals(
-        self,
-        mocker: MockFixture,
-        aggregate_observation_intervals: Dict,
-    ) -> None:
-        obs_sets = [
-            [
-                "location_uuid_1",
-                "low",
-                121,
-                91,
-                81,
-                71,
-                81,
-                91,
-                101,
-                111,
-                101,
-                91,
-                71,
-                61,
-                51,
-                41,
-                31,
-                21,
-                11,
-                51,
-            ]
-        ]
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-            return_value=obs_sets,
-        )
-        result = controller.observation_sets_time_intervals(
-            start_date="2021-01-01",
-            end_date="2021-02-01",
-            location_uuids=["location_uuid_1"],
-        )
-        assert result == aggregate_observation_intervals
-
-    def test_agg_observation_sets_by_month(
+    @pytest.mark.parametrize(
+        ["controller_function", "rows", "expected_fixture", "date_range"],
+        [
+            (
+                "on_time_observation_sets",
+                _ON_TIME_ROWS,
+                "aggregate_observation_sets",
+                _JAN_2021,
+            ),
+            (
+                "missing_observation_sets",
+                _MISSING_ROWS,
+                "aggregate_missing_observation_sets",
+                _JAN_2021,
+            ),
+            (
+                "observation_sets_time_intervals",
+                _TIME_INTERVAL_ROWS,
+                "aggregate_observation_intervals",
+                _JAN_2021,
+            ),
+            (
+                "agg_observation_sets_by_month",
+                _AGG_BY_MONTH_ROWS,
+                "agg_observation_sets_by_month",
+                _AUG_SEP_2021,
+            ),
+        ],
+    )
+    def test_aggregate_observation_sets(
         self,
+        request: pytest.FixtureRequest,
         mocker: MockFixture,
-        agg_observation_sets_by_month: Dict,
+        controller_function: str,
+        rows: Tuple,
+        expected_fixture: str,
+        date_range: Dict[str, str],
     ) -> None:
-        obs_sets = [
-            [
-                "2021-09",
-                "low",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "2021-09",
-                "low-medium",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "2021-09",
-                "medium",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "2021-09",
-                "high",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "2021-08",
-                "low",
-                35,
-                5,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "2021-08",
-                "low-medium",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "2021-08",
-                "medium",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "2021-08",
-                "high",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-        ]
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-            return_value=obs_sets,
-        )
-        result = controller.agg_observation_sets_by_month(
-            start_date="2021-08-01",
-            end_date="2021-10-01",
-            location_uuids=["location_uuid_1"],
+        mocker.patch.object(controller.db.engine, "execute", return_value=rows)
+        result = getattr(controller, controller_function)(
+            **date_range, location_uuids=["location_uuid_1"]
         )
-        assert result == agg_observation_sets_by_month
+        assert result == request.getfixturevalue(expected_fixture)
 
     def test_agg_observation_sets_by_location_month(
         self,
         mocker: MockFixture,
         agg_observation_sets_by_location_month: Dict,
     ) -> None:
-        obs_sets = [
-            [
-                "location_uuid_1",
-                "2021-09",
-                "low",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "location_uuid_1",
-                "2021-09",
-                "low-medium",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "location_uuid_1",
-                "2021-09",
-                "medium",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "location_uuid_1",
-                "2021-09",
-                "high",
-                25,
-                5,
-                10,
-                24,
-                24,
-                23,
-                23,
-                21,
-                21,
-                17,
-                17,
-                17,
-            ],
-            [
-                "location_uuid_1",
-                "2021-08",
-                "low",
-                35,
-                5,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "location_uuid_1",
-                "2021-08",
-                "low-medium",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "location_uuid_1",
-                "2021-08",
-                "medium",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-            [
-                "location_uuid_1",
-                "2021-08",
-                "high",
-                35,
-                10,
-                20,
-                33,
-                33,
-                31,
-                31,
-                27,
-                27,
-                19,
-                19,
-                19,
-            ],
-        ]
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.controller.db.engine.execute",
-            return_value=obs_sets,
-        )
-        result = controller.all_agg_obs_by_location_by_month(
-            start_date="2021-08-01",
-            end_date="2021-10-01",
+        mocker.patch.object(
+            controller.db.engine, "execute", return_value=_AGG_BY_LOCATION_MONTH_ROWS
         )
+        result = controller.all_agg_obs_by_location_by_month(**_AUG_SEP_2021)
         assert result == agg_observation_sets_by_location_month
 
     def test_mins_late(
@@ -516,18 +193,14 @@ class TestController:
     ) -> None:
         obs_set: ObservationSetRequest.Meta.Dict = {
             "score_system": "news2",
-            "record_time": parse_iso8601_to_datetime_typesafe(
-                "2021-10-05T09:10:00.000Z"
-            ),
+            "record_time": T_2021_10_05_0910,
             "spo2_scale": 1,
             "observations": [
                 {
                     "observation_type": "temperature",
                     "patient_refused": False,
                     "observation_unit": "celsius",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "2021-10-05T09:10:00.000Z"
-                    ),
+                    "measured_time": T_2021_10_05_0910,
                     "observation_value": 35,
                 }
             ],
@@ -536,9 +209,7 @@ class TestController:
             "patient_id": "patient_uuid",
             "score_severity": "low-medium",
             "score_string": "3",
-            "time_next_obs_set_due": parse_iso8601_to_datetime_typesafe(
-                "2021-10-05T10:00:00.000Z"
-            ),
+            "time_next_obs_set_due": T_2021_10_05_1000,
         }
         mock_obs_update = mocker.patch(
             "dhos_observations_api.blueprint_api.message.publish_scored_obs_message",
@@ -548,73 +219,75 @@ class TestController:
         mock_obs_update.assert_called_with(obs1)
         assert obs1["mins_late"] == 0
 
-        obs_set["record_time"] = parse_iso8601_to_datetime_typesafe(
-            "2021-10-05T11:20:00.000Z"
-        )
-        obs_set["time_next_obs_set_due"] = parse_iso8601_to_datetime_typesafe(
-            "2021-10-05T12:20:00.000Z"
-        )
+        obs_set["record_time"] = T_2021_10_05_1120
+        obs_set["time_next_obs_set_due"] = T_2021_10_05_1220
         obs2 = controller.create_observation_set(obs_set, suppress_obs_publish=False)
         assert obs2["mins_late"] == 80
 
+
+@pytest.mark.xdist_group("perf")
+@pytest.mark.usefixtures("app")
+class TestLatestObservationSets:
+    @pytest.mark.slow
     def test_get_latest_observation_sets_by_encounter_ids_performance(
-        self, mocker: MockFixture, statement_counter: Callable
+        self, latest_obs_seed: Tuple[List[str], datetime]
     ) -> None:
-        encounter_uuids = []
-        mocker.patch(
-            "dhos_observations_api.blueprint_api.message.publish_scored_obs_message",
-            return_value=None,
+        encounter_uuids, _ = latest_obs_seed
+        time_start = time.perf_counter()
+        results = controller.get_latest_observation_sets_by_encounter_ids(
+            encounter_ids=encounter_uuids
         )
-        for i in range(100):
-            encounter_uuid = str(uuid.uuid4())
-            encounter_uuids.append(encounter_uuid)
-            record_time = datetime(
-                2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc
-            ) + timedelta(seconds=i)
-            for j in range(10):
-                record_time = datetime(
-                    2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc
-                ) + timedelta(seconds=j)
-                obs_set: ObservationSetRequest.Meta.Dict = {
-                    "score_system": "news2",
-                    "record_time": record_time,
-                    "spo2_scale": 1,
-                    "observations": [
-                        {
-                            "observation_type": "temperature",
-                            "patient_refused": False,
-                            "observation_unit": "celsius",
-                            "measured_time": record_time,
-                            "observation_value": 35,
-                        },
-                        {
-                            "observation_type": "o2_therapy_status",
-                            "patient_refused": False,
-                            "observation_unit": "L/min",
-                            "measured_time": record_time,
-                            "observation_value": 22,
-                            "observation_metadata": {
-                                "mask": "High Flow",
-                                "mask_percent": 35,
-                            },
-                        },
-                    ],
-                    "encounter_id": encounter_uuid,
-                    "is_partial": True,
-                    "patient_id": "patient_uuid",
-                    "score_severity": "low-medium",
-                    "score_string": "3",
-                    "time_next_obs_set_due": record_time,
-                }
-
-            controller.create_observation_set(obs_set, suppress_obs_publish=False)
+        time_taken = time.perf_counter() - time_start
+        print(f"get_latest_observation_sets_by_encounter_ids:{time_taken}")
+        assert len(results) == 100
+        assert time_taken < 0.5
 
+    def test_get_latest_observation_sets_by_encounter_ids_picks_latest(
+        self, latest_obs_seed: Tuple[List[str], datetime], statement_counter: Callable
+    ) -> None:
+        encounter_uuids, latest_record_time = latest_obs_seed
         with statement_counter(limit=1):
-            time_start = time.perf_counter()
             results = controller.get_latest_observation_sets_by_encounter_ids(
-                encounter_ids=encounter_uuids
+                encounter_ids=encounter_uuids[:10]
             )
-            time_taken = time.perf_counter() - time_start
-        print(f"get_latest_observation_sets_by_encounter_ids:{time_taken}")
-        assert len(results) == 100
-        assert time_taken < 0.5
+        assert sorted(results) == sorted(encounter_uuids[:10])
+        assert {obs_set["record_time"] for obs_set in results.values()} == {
+            latest_record_time
+        }
+
+
+class TestParseDateRange:
+    @pytest.mark.parametrize(
+        "start_date,end_date,expected_start,expected_end",
+        [
+            (
+                "1970-01-03T00:00:00.000",
+                "1970-01-04T00:00:00.000Z",
+                datetime(1970, 1, 3, tzinfo=timezone.utc),
+                datetime(1970, 1, 4, tzinfo=timezone.utc),
+            ),
+            (
+                "1970-01-03T00:00:00.000Z",
+                "1970-01-04T00:00",
+                datetime(1970, 1, 3, tzinfo=timezone.utc),
+                datetime(1970, 1, 4, 0, 0, 59, 999_999, tzinfo=timezone.utc),
+            ),
+            (
+                "1970-01-03T00:00:00.000Z",
+                "1970-01-04",
+                datetime(1970, 1, 3, tzinfo=timezone.utc),
+                datetime(1970, 1, 4, 23, 59, 59, 999_999, tzinfo=timezone.utc),
+            ),
+        ],
+    )
+    def test_loose_dates(
+        self,
+        start_date: str,
+        end_date: str,
+        expected_start: datetime,
+        expected_end: datetime,
+    ) -> None:
+        assert controller._parse_date_range(start_date, end_date) == (
+            expected_start,
+            expected_end,
+        )
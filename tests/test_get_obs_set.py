@@ -1,8 +1,8 @@
 from datetime import datetime, timezone
-from typing import Any, Callable, Dict, Generator
+from typing import Any, Callable, Dict
 
 import pytest
-from flask import jsonify
+from flask import current_app
 from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.error_handler import EntityNotFoundException
 from flask_batteries_included.helpers.timestamp import (
@@ -12,22 +12,16 @@ from flask_batteries_included.sqldb import db
 
 from dhos_observations_api.blueprint_api import controller
 from dhos_observations_api.models.api_spec import ObservationSetResponse
-from dhos_observations_api.models.sql.observation import Observation
-from dhos_observations_api.models.sql.observation_metadata import ObservationMetaData
 from dhos_observations_api.models.sql.observation_set import ObservationSet
 
+T_2018_01_01 = parse_iso8601_to_datetime_typesafe("2018-01-01T00:00:00.000Z")
+T_2018_01_02 = parse_iso8601_to_datetime_typesafe("2018-01-02T00:00:00.000Z")
+
+_RESPONSE_SCHEMA = ObservationSetResponse()
 
-@pytest.mark.usefixtures("app", "jwt_send_clinician_uuid")
-class TestGetObservationSet:
-    @pytest.fixture(autouse=True)
-    def clean_up_after_test(self) -> Generator[None, None, None]:
-        # Yield nothing, then after the test run the cleanup query.
-        yield
-        for model in (ObservationMetaData, Observation, ObservationSet):
-            rows_deleted = db.session.query(model).delete()
-            print(f"{model.__name__}: {rows_deleted} rows deleted")
-        db.session.commit()
 
+@pytest.mark.usefixtures("app", "jwt_send_clinician_uuid", "uses_sql_database")
+class TestGetObservationSet:
     def test_get_obs_set_unknown_uuid(self) -> None:
         with pytest.raises(EntityNotFoundException):
             controller.get_observation_set_by_id(observation_set_uuid="fake-uuid")
@@ -50,11 +44,13 @@ class TestGetObservationSet:
         )
 
         with statement_counter(limit=1):
-            response = jsonify(
-                controller.get_observation_set_by_id(obs_set["uuid"], compact=compact)
+            result = controller.get_observation_set_by_id(
+                obs_set["uuid"], compact=compact
             )
-        assert response.json
-        returned_obs_set: Dict[str, Any] = ObservationSetResponse().load(response.json)
+        # Serialised as jsonify would, without building a Response around it.
+        returned_obs_set: Dict[str, Any] = _RESPONSE_SCHEMA.loads(
+            current_app.json.dumps(result)
+        )
 
         assert returned_obs_set["uuid"] == obs_set["uuid"]
         assert returned_obs_set["observations"][0]["patient_refused"] is False
@@ -136,44 +132,25 @@ class TestGetObservationSet:
         newer_record_time = datetime(2018, 1, 2, 0, 0, 0, tzinfo=timezone.utc)
         another_record_time = datetime(2010, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
 
-        parent_obs_dict = ObservationSet.new(
-            encounter_id=encounter_uuid,
-            record_time=newer_record_time,
-            observations=[
-                {
-                    "patient_refused": False,
-                    "observation_value": 1,
-                    "observation_type": "spo2",
-                }
-            ],
-        )
-        parent_obs = ObservationSet.query.get(parent_obs_dict["uuid"])
-
-        child_obs_dict = ObservationSet.new(
-            encounter_id=child_encounter_uuid,
-            record_time=older_record_time,
-            observations=[
-                {
-                    "patient_refused": False,
-                    "observation_value": 1,
-                    "observation_type": "spo2",
-                }
-            ],
-        )
-        child_obs = ObservationSet.query.get(child_obs_dict["uuid"])
-
-        another_child_obs_dict = ObservationSet.new(
-            encounter_id=another_child_encounter_uuid,
-            record_time=another_record_time,
-            observations=[
-                {
-                    "patient_refused": False,
-                    "observation_value": 1,
-                    "observation_type": "spo2",
-                }
-            ],
-        )
-        another_child_obs = ObservationSet.query.get(another_child_obs_dict["uuid"])
+        # Only the UUIDs are compared, so the sets are not loaded back as models.
+        parent_obs, child_obs, another_child_obs = [
+            ObservationSet.new(
+                encounter_id=encounter_id,
+                record_time=record_time,
+                observations=[
+                    {
+                        "patient_refused": False,
+                        "observation_value": 1,
+                        "observation_type": "spo2",
+                    }
+                ],
+            )["uuid"]
+            for encounter_id, record_time in [
+                (encounter_uuid, newer_record_time),
+                (child_encounter_uuid, older_record_time),
+                (another_child_encounter_uuid, another_record_time),
+            ]
+        ]
 
         for limit, expected_encounter_ids, expected_obs_sets in [
             (
@@ -202,7 +179,7 @@ class TestGetObservationSet:
             observation_ids = [o["uuid"] for o in observation_sets]
 
             assert encounter_ids == expected_encounter_ids
-            assert observation_ids == [obs.uuid for obs in expected_obs_sets]
+            assert observation_ids == expected_obs_sets
 
     def test_get_latest_observation_set_for_encounter_unknown(
         self, encounter_uuid: str
@@ -218,7 +195,7 @@ class TestGetObservationSet:
 
         ObservationSet.new(
             encounter_id=encounter_uuid,
-            record_time=parse_iso8601_to_datetime_typesafe("2018-01-01T00:00:00.000Z"),
+            record_time=T_2018_01_01,
             score_system="news2",
             spo2_scale=1,
             observations=[
@@ -226,24 +203,20 @@ class TestGetObservationSet:
                     "patient_refused": False,
                     "observation_value": 1,
                     "observation_type": "spo2",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "2018-01-01T00:00:00.000Z"
-                    ),
+                    "measured_time": T_2018_01_01,
                 },
                 {
                     "patient_refused": False,
                     "observation_value": 1,
                     "observation_type": "heart_rate",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "2018-01-01T00:00:00.000Z"
-                    ),
+                    "measured_time": T_2018_01_01,
                 },
             ],
         )
 
         obs_set_newer = ObservationSet.new(
             encounter_id=encounter_uuid,
-            record_time=parse_iso8601_to_datetime_typesafe("2018-01-02T00:00:00.000Z"),
+            record_time=T_2018_01_02,
             score_system="news2",
             spo2_scale=1,
             observations=[
@@ -251,17 +224,13 @@ class TestGetObservationSet:
                     "patient_refused": False,
                     "observation_value": 60,
                     "observation_type": "heart_rate",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "2018-01-02T00:00:00.000Z"
-                    ),
+                    "measured_time": T_2018_01_02,
                 },
                 {
                     "patient_refused": False,
                     "observation_value": 1,
                     "observation_type": "spo2",
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "2018-01-02T00:00:00.000Z"
-                    ),
+                    "measured_time": T_2018_01_02,
                 },
             ],
         )
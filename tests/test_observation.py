@@ -53,3 +53,21 @@ class TestObservation:
             measured_time="1970-01-01T00:00:00.000Z",
         )
         assert isinstance(obs, Observation)
+
+    def test_to_dict_key_order(self) -> None:
+        obs = Observation.new(
+            observation_value=1,
+            observation_type="temperature",
+            measured_time="1970-01-01T00:00:00.000Z",
+        )
+        assert list(obs.to_dict()) == [
+            "observation_type",
+            "patient_refused",
+            "score_value",
+            "observation_value",
+            "observation_string",
+            "observation_unit",
+            "observation_metadata",
+            "measured_time",
+            "uuid",
+        ]
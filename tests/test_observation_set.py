@@ -1,14 +1,14 @@
-import itertools
+import random
 import uuid
 from datetime import datetime, timedelta, timezone
-from random import randint
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
 
 import pytest
 from flask import jsonify
 from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.error_handler import UnprocessibleEntityException
 from flask_batteries_included.sqldb import db
+from sqlalchemy.orm import joinedload, load_only
 
 from dhos_observations_api.blueprint_api.controller import (
     get_latest_observation_set_for_encounters,
@@ -24,8 +24,23 @@ from dhos_observations_api.models.api_spec import (
 )
 from dhos_observations_api.models.sql.observation_set import ObservationSet
 
+T_2019_01_01_115920 = datetime(2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
+# One second apart, the record times most of these tests seed.
+RECORD_TIMES = tuple(T_2019_01_01_115920 + timedelta(seconds=i) for i in range(10))
+# Seeded so the bulk observation values are the same on every run.
+_RNG = random.Random(0xC0FFEE)
+_OBS_TYPES = (
+    "temperature",
+    "subjective_fever",
+    "continuous_cough",
+    "illness",
+    "something_else",
+)
+
 
-@pytest.mark.usefixtures("app", "jwt_send_clinician_uuid", "uses_sql_database")
+@pytest.mark.usefixtures(
+    "app", "jwt_send_clinician_uuid", "uses_sql_database", "raise_on_lazy_load"
+)
 class TestObservationSet:
     def test_new_method(self, encounter_uuid: str, location_uuid: str) -> None:
         record_time = datetime(2019, 1, 1, 11, 59, 50, tzinfo=timezone.utc)
@@ -44,7 +59,7 @@ class TestObservationSet:
             encounter_id=encounter_uuid,
             location=location_uuid,
         )
-        db.session.commit()
+        db.session.flush()
         assert return_value["encounter_id"] == encounter_uuid
         assert return_value["location"] == location_uuid
 
@@ -75,88 +90,125 @@ class TestObservationSet:
             encounter_id=encounter_uuid,
             location=location_uuid,
         )
-        db.session.commit()
+        db.session.flush()
         assert return_value["spo2_scale"] == 1
 
-    def test_returns_latest_observation_set(self, encounter_uuid: str) -> None:
-        for i in range(10):
-            record_time = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-
-            ObservationSet.new(
-                observations=[],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid,
-            )
+    def test_returns_latest_observation_set(
+        self, encounter_uuid: str, bulk_insert_obs_sets: Callable
+    ) -> None:
+        bulk_insert_obs_sets(
+            [
+                *(
+                    {
+                        "observations": [],
+                        "record_time": record_time,
+                        "score_system": "news2",
+                        "encounter_id": encounter_uuid,
+                    }
+                    for record_time in RECORD_TIMES
+                ),
+                {
+                    "observations": [],
+                    "record_time": datetime(
+                        2020, 1, 1, 11, 59, 20, tzinfo=timezone.utc
+                    ),
+                    "score_system": "news2",
+                    "encounter_id": "different_encounter",
+                },
+            ]
+        )
 
-        record_time = datetime(2020, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
+        obs_set = get_latest_observation_set_for_encounters([encounter_uuid])
+        assert isinstance(obs_set, dict)
+        assert obs_set["record_time"] == RECORD_TIMES[-1]
+        assert obs_set["encounter_id"] == encounter_uuid
 
-        ObservationSet.new(
-            observations=[],
-            record_time=record_time,
+    @pytest.mark.parametrize("compact", [True, False])
+    def test_latest_observation_set_matches_to_dict(
+        self, encounter_uuid: str, compact: bool
+    ) -> None:
+        obs_set_uuid = ObservationSet.new(
+            observations=[
+                {
+                    "observation_type": "spo2",
+                    "measured_time": T_2019_01_01_115920,
+                    "observation_value": 97,
+                    "observation_metadata": {"mask": "Venturi", "mask_percent": 28},
+                },
+                {
+                    "observation_type": "temperature",
+                    "measured_time": T_2019_01_01_115920,
+                    "observation_value": 37.2,
+                },
+            ],
+            record_time=T_2019_01_01_115920,
             score_system="news2",
-            spo2_scale=1,
-            encounter_id="different_encounter",
+            encounter_id=encounter_uuid,
+        )["uuid"]
+        db.session.flush()
+        db.session.expunge_all()
+
+        obs_set = db.session.get(
+            ObservationSet,
+            obs_set_uuid,
+            options=[joinedload(ObservationSet.observations)],
+        )
+        expected = obs_set.to_dict(compact=compact)
+        actual = get_latest_observation_set_for_encounters(
+            [encounter_uuid], compact=compact
         )
-        db.session.commit()
 
-        obs_set = get_latest_observation_set_for_encounters([encounter_uuid])
-        assert isinstance(obs_set, dict)
-        assert obs_set["record_time"] == datetime(
-            2019, 1, 1, 11, 59, 29, tzinfo=timezone.utc
+        assert actual["created"].tzinfo is not None
+        assert actual["modified"].tzinfo is not None
+        assert sorted(actual.pop("observations"), key=lambda o: o["uuid"]) == sorted(
+            expected.pop("observations"), key=lambda o: o["uuid"]
         )
-        assert obs_set["encounter_id"] == encounter_uuid
+        assert actual == expected
 
     @pytest.fixture
     def bulk_obs_times(self) -> List[datetime]:
         OBS_PER_ENCOUNTER = 4
-        base_record_time = datetime(2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
-        obs_record_times = [
-            base_record_time + timedelta(seconds=i) for i in range(OBS_PER_ENCOUNTER)
-        ]
-        return obs_record_times
+        return list(RECORD_TIMES[:OBS_PER_ENCOUNTER])
 
     @pytest.fixture
-    def bulk_encounter_data(self, bulk_obs_times: List[datetime]) -> List[str]:
+    def bulk_encounter_data(
+        self, bulk_insert_obs_sets: Callable, bulk_obs_times: List[datetime]
+    ) -> List[str]:
         NUM_ENCOUNTERS = 5
 
-        encounter_uuids = []
-        with db.session.begin(subtransactions=True):
-            for e in range(NUM_ENCOUNTERS):
-                encounter_uuid = generate_uuid()
-                for record_time in bulk_obs_times:
-                    ObservationSet.new(
-                        observations=[
-                            {
-                                "observation_type": "o2_therapy_status",
-                                "patient_refused": False,
-                                "observation_unit": "",
-                                "measured_time": record_time,
-                                "observation_value": 0,
-                                "observation_metadata": {
-                                    "mask": "Room Air",
-                                    "mask_percent": None,
-                                },
-                                "score_value": 0,
-                            },
-                            {
-                                "observation_type": "respiratory_rate",
-                                "patient_refused": False,
-                                "observation_unit": "/min",
-                                "measured_time": record_time,
-                                "observation_value": 35,
-                                "score_value": 3,
-                            },
-                        ],
-                        record_time=record_time,
-                        score_system="news2",
-                        spo2_scale=1,
-                        encounter_id=encounter_uuid,
-                    )
-
-                encounter_uuids.append(encounter_uuid)
-
+        encounter_uuids = [generate_uuid() for e in range(NUM_ENCOUNTERS)]
+        bulk_insert_obs_sets(
+            {
+                "observations": [
+                    {
+                        "observation_type": "o2_therapy_status",
+                        "patient_refused": False,
+                        "observation_unit": "",
+                        "measured_time": record_time,
+                        "observation_value": 0,
+                        "observation_metadata": {
+                            "mask": "Room Air",
+                            "mask_percent": None,
+                        },
+                        "score_value": 0,
+                    },
+                    {
+                        "observation_type": "respiratory_rate",
+                        "patient_refused": False,
+                        "observation_unit": "/min",
+                        "measured_time": record_time,
+                        "observation_value": 35,
+                        "score_value": 3,
+                    },
+                ],
+                "record_time": record_time,
+                "score_system": "news2",
+                "spo2_scale": 1,
+                "encounter_id": encounter_uuid,
+            }
+            for encounter_uuid in encounter_uuids
+            for record_time in bulk_obs_times
+        )
         return encounter_uuids
 
     def test_returns_latest_observation_sets(
@@ -181,43 +233,20 @@ class TestObservationSet:
         ],
     )
     def test_returns_observation_sets_at_a_location(
-        self, start_date: str, end_date: str, statement_counter: Callable
+        self,
+        start_date: str,
+        end_date: str,
+        statement_counter: Callable,
+        location_obs_seed: Tuple[str, str, str],
     ) -> None:
-        location_uuid: str = generate_uuid()
-        encounter_uuid: str = generate_uuid()
-        for i in range(5):
-            record_time = datetime(2019, 1, i + 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-            ObservationSet.new(
-                observations=[
-                    {
-                        "observation_type": "o2_therapy_status",
-                        "patient_refused": False,
-                        "observation_unit": "L/min",
-                        "measured_time": record_time,
-                        "observation_value": 22,
-                        "observation_metadata": {
-                            "mask": "High Flow",
-                            "mask_percent": 35,
-                        },
-                    },
-                ],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid,
-                location=location_uuid,
-            )
+        location_uuid, _, _ = location_obs_seed
 
         with statement_counter(limit=1):
-            response = get_observation_sets_by_locations_and_date_range(
+            obs_sets = get_observation_sets_by_locations_and_date_range(
                 location_uuids=[location_uuid],
                 start_date_str=start_date,
                 end_date_str=end_date,
             )
-        obs = jsonify(response).json
-        assert obs
-        obs_sets: List[Dict[str, Any]] = ObservationSetResponse().load(obs, many=True)
-
         assert len(obs_sets) == 1
         assert obs_sets[0]["record_time"] == datetime(
             2019, 1, 4, 11, 59, 23, tzinfo=timezone.utc
@@ -225,74 +254,30 @@ class TestObservationSet:
         assert obs_sets[0]["mins_late"] is None
 
     def test_returns_observation_sets_at_a_parent_location(
-        self,
+        self, location_obs_seed: Tuple[str, str, str]
     ) -> None:
-        location_uuid_1: str = generate_uuid()
-        location_uuid_2: str = generate_uuid()
-        encounter_uuid: str = generate_uuid()
+        _, location_uuid, _ = location_obs_seed
 
-        for i in range(5):
-            record_time = datetime(1970, 1, i + 1, 0, 0, 1, tzinfo=timezone.utc)
-            ObservationSet.new(
-                observations=[],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid,
-                location=location_uuid_2,
-            )
-
-        response = get_observation_sets_by_locations_and_date_range(
-            location_uuids=[location_uuid_1, location_uuid_2],
+        obs_sets = get_observation_sets_by_locations_and_date_range(
+            location_uuids=[generate_uuid(), location_uuid],
             start_date_str="1970-01-03T12:00:01.000Z",
             end_date_str="1970-01-04T12:00:01.000Z",
         )
-        obs = jsonify(response).json
-        assert obs
-        obs_sets: List[Dict[str, Any]] = ObservationSetResponse().load(obs, many=True)
         assert len(obs_sets) == 1
         assert obs_sets[0]["record_time"] == datetime(
             1970, 1, 4, 0, 0, 1, tzinfo=timezone.utc
         )
 
     def test_returns_observation_sets_at_parent_and_child_locations(
-        self,
+        self, location_obs_seed: Tuple[str, str, str]
     ) -> None:
-        location_uuid_1: str = generate_uuid()
-        location_uuid_2: str = generate_uuid()
-        encounter_uuid_1: str = generate_uuid()
-        encounter_uuid_2: str = generate_uuid()
+        _, location_uuid_1, location_uuid_2 = location_obs_seed
 
-        for i in range(5):
-            record_time = datetime(1970, 1, i + 1, 0, 0, 1, tzinfo=timezone.utc)
-            ObservationSet.new(
-                observations=[],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid_1,
-                location=location_uuid_1,
-            )
-
-        for i in range(5):
-            ObservationSet.new(
-                observations=[],
-                record_time=datetime(1970, 1, i + 1, 0, 0, 1, tzinfo=timezone.utc),
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid_2,
-                location=location_uuid_2,
-            )
-
-        response = get_observation_sets_by_locations_and_date_range(
+        obs_sets = get_observation_sets_by_locations_and_date_range(
             location_uuids=[location_uuid_1, location_uuid_2],
             start_date_str="1970-01-03T12:00:01.000Z",
             end_date_str="1970-01-04T12:00:01.000Z",
         )
-        obs = jsonify(response).json
-        assert obs
-        obs_sets: List[Dict[str, Any]] = ObservationSetResponse().load(obs, many=True)
-
         assert len(obs_sets) == 2
         assert obs_sets[0]["record_time"] == datetime(
             1970, 1, 4, 0, 0, 1, tzinfo=timezone.utc
@@ -302,21 +287,9 @@ class TestObservationSet:
         )
 
     def test_returns_observation_sets_at_a_parent_location_compact_dict(
-        self,
+        self, location_obs_seed: Tuple[str, str, str]
     ) -> None:
-        location_uuid: str = generate_uuid()
-        encounter_uuid: str = generate_uuid()
-
-        for i in range(5):
-            record_time = datetime(1970, 1, i + 1, 0, 0, 1, tzinfo=timezone.utc)
-            ObservationSet.new(
-                observations=[],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=encounter_uuid,
-                location=location_uuid,
-            )
+        _, location_uuid, _ = location_obs_seed
 
         obs_sets = get_observation_sets_by_locations_and_date_range(
             location_uuids=[location_uuid],
@@ -350,33 +323,26 @@ class TestObservationSet:
     def test_returns_observation_set_by_patient_id(
         self, patient_uuid: str, clinician: str
     ) -> None:
-        for i in range(5):
-            record_time = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-            created = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-            modified = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-
+        for record_time in RECORD_TIMES[:5]:
             ObservationSet.new(
                 observations=[],
                 record_time=record_time,
                 patient_id=patient_uuid,
-                created=created,
-                modified=modified,
+                created=record_time,
+                modified=record_time,
             )
 
-        for i in range(5):
+        for record_time in RECORD_TIMES[:5]:
             different_patient_id = generate_uuid()
-            record_time = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-            created = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-            modified = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
             ObservationSet.new(
                 observations=[],
                 record_time=record_time,
                 patient_id=different_patient_id,
-                created=created,
-                modified=modified,
+                created=record_time,
+                modified=record_time,
             )
 
-        db.session.commit()
+        db.session.flush()
 
         obs_sets = get_observation_sets_for_patient(patient_id=patient_uuid)
 
@@ -389,53 +355,56 @@ class TestObservationSet:
         assert parsed["patient_id"] == patient_uuid
 
 
-@pytest.mark.usefixtures("app", "jwt_send_clinician_uuid", "uses_sql_database")
+@pytest.mark.usefixtures(
+    "app", "jwt_send_clinician_uuid", "uses_sql_database", "raise_on_lazy_load"
+)
 class TestBulkObservations:
     def _random_obs(
         self, observation_type: str, measured_time: datetime
     ) -> ObservationRequest.Meta.Dict:
         return {
             "observation_metadata": {"patient_position": "upright"},
-            "observation_value": randint(0, 99),
+            "observation_value": _RNG.randrange(100),
             "observation_type": observation_type,
             "measured_time": measured_time,
         }
 
     def _random_obs_set(
         self, record_time: datetime, patient_uuid: str, obs_count: int
-    ) -> None:
-        observation_type: itertools.cycle[str] = itertools.cycle(
-            [
-                "temperature",
-                "subjective_fever",
-                "continuous_cough",
-                "illness",
-                "something_else",
-            ]
-        )
-        ObservationSet.new(
-            record_time=record_time,
-            observations=[
-                self._random_obs(next(observation_type), measured_time=record_time)
+    ) -> Dict[str, Any]:
+        return {
+            "record_time": record_time,
+            "observations": [
+                self._random_obs(
+                    _OBS_TYPES[d % len(_OBS_TYPES)], measured_time=record_time
+                )
                 for d in range(obs_count)
             ],
-            patient_id=patient_uuid,
-        )
+            "patient_id": patient_uuid,
+        }
 
-    def _random_patient(self, obs_set_count: int, obs_per_set: int) -> str:
+    def _random_patient(
+        self, obs_set_count: int, obs_per_set: int
+    ) -> Tuple[str, List[Dict[str, Any]]]:
         today = datetime.utcnow().replace(tzinfo=timezone.utc)
         patient_uuid = generate_uuid()
-        for i in range(obs_set_count):
-            obs_time = today - timedelta(days=obs_set_count - i)
+        obs_sets = [
             self._random_obs_set(
-                record_time=obs_time, patient_uuid=patient_uuid, obs_count=obs_per_set
+                record_time=today - timedelta(days=obs_set_count - i),
+                patient_uuid=patient_uuid,
+                obs_count=obs_per_set,
             )
-
-        return patient_uuid
+            for i in range(obs_set_count)
+        ]
+        return patient_uuid, obs_sets
 
     @pytest.fixture
     def bulk_patient_uuids(
-        self, bulk_patients: int, sets_per_patient: int, obs_per_set: int
+        self,
+        bulk_insert_obs_sets: Callable,
+        bulk_patients: int,
+        sets_per_patient: int,
+        obs_per_set: int,
     ) -> List[str]:
         patients = [
             self._random_patient(
@@ -443,8 +412,10 @@ class TestBulkObservations:
             )
             for i in range(bulk_patients)
         ]
-        db.session.commit()
-        return patients
+        bulk_insert_obs_sets(
+            obs_set for _, obs_sets in patients for obs_set in obs_sets
+        )
+        return [patient_uuid for patient_uuid, _ in patients]
 
     @pytest.mark.parametrize("bulk_patients,sets_per_patient,obs_per_set", [(3, 20, 5)])
     def test_get_observation_sets_for_patient(
@@ -453,18 +424,16 @@ class TestBulkObservations:
         obs_sets = get_observation_sets_for_patient(patient_id=bulk_patient_uuids[1])
         assert len(obs_sets) == sets_per_patient
 
-    def test_get_observation_sets(self) -> None:
-        for i in range(10):
-            record_time = datetime(2019, 1, 1, 11, 59, 20 + i, tzinfo=timezone.utc)
-
-            ObservationSet.new(
-                observations=[],
-                record_time=record_time,
-                score_system="news2",
-                spo2_scale=1,
-                encounter_id=str(uuid.uuid4()),
-            )
-        db.session.commit()
+    def test_get_observation_sets(self, bulk_insert_obs_sets: Callable) -> None:
+        bulk_insert_obs_sets(
+            {
+                "observations": [],
+                "record_time": record_time,
+                "score_system": "news2",
+                "encounter_id": str(uuid.uuid4()),
+            }
+            for record_time in RECORD_TIMES
+        )
 
         obs_sets = get_observation_sets(modified_since="1970-01-01", compact=False)
         assert len(obs_sets) == 10
@@ -510,9 +479,13 @@ class TestBulkObservations:
         db.session.commit()
         update_mins_late_for_encounter(encounter_id=encounter_id_1)
         update_mins_late_for_encounter(encounter_id=encounter_id_2)
+        obs_sets = {
+            os.uuid: os
+            for os in ObservationSet.query.options(
+                load_only(ObservationSet.uuid, ObservationSet.mins_late)
+            ).filter(ObservationSet.uuid.in_(uuids_1 + uuids_2))
+        }
         for i, id in enumerate(uuids_1):
-            os = ObservationSet.query.filter(ObservationSet.uuid == id).first()
-            assert os.mins_late == mins_late[i]
+            assert obs_sets[id].mins_late == mins_late[i]
         for i, id in enumerate(uuids_2):
-            os = ObservationSet.query.filter(ObservationSet.uuid == id).first()
-            assert os.mins_late == mins_late[i]
+            assert obs_sets[id].mins_late == mins_late[i]
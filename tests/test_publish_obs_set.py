@@ -1,17 +1,19 @@
 from typing import Literal
+from unittest.mock import Mock
 
 import pytest
 from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.timestamp import (
     parse_iso8601_to_datetime_typesafe,
 )
-from mock import Mock
 
 from dhos_observations_api.blueprint_api import controller
 from dhos_observations_api.models.api_spec import ObservationSetRequest
 
+T_1970_01_01 = parse_iso8601_to_datetime_typesafe("1970-01-01T00:00:00.000Z")
 
-@pytest.mark.usefixtures("app")
+
+@pytest.mark.usefixtures("app", "uses_sql_database")
 class TestPublishObservationSet:
     @pytest.mark.parametrize(
         ["suppress_obs_publish", "expected_call_count", "encounter_or_patient"],
@@ -26,17 +28,13 @@ class TestPublishObservationSet:
         encounter_or_patient: Literal["encounter", "patient"],
     ) -> None:
         json_in: ObservationSetRequest.Meta.Dict = {
-            "record_time": parse_iso8601_to_datetime_typesafe(
-                "1970-01-01T00:00:00.000Z"
-            ),
+            "record_time": T_1970_01_01,
             "score_system": "news2",
             "observations": [
                 {
                     "observation_type": "spo2",
                     "observation_value": 42,
-                    "measured_time": parse_iso8601_to_datetime_typesafe(
-                        "1970-01-01T00:00:00.000Z"
-                    ),
+                    "measured_time": T_1970_01_01,
                 }
             ],
             "obx_reference_range": "0-4",
@@ -1,61 +1,107 @@
 from datetime import datetime, timezone
-from typing import Dict
+from typing import Any, Callable, Dict, Iterable, Union
 
 import pytest
+from flask_batteries_included.helpers import generate_uuid
 from flask_batteries_included.helpers.error_handler import EntityNotFoundException
 from flask_batteries_included.sqldb import db
+from pytest_mock import MockFixture
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 from dhos_observations_api.blueprint_api import controller
 from dhos_observations_api.models.sql.observation import Observation
 from dhos_observations_api.models.sql.observation_set import ObservationSet
 
+T_2019_01_01_115920 = datetime(2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
+
+
+def _by_type(observations: Iterable[Union[Dict, Observation]]) -> Dict[str, Any]:
+    """Observation dicts or models keyed by their observation_type."""
+    return {
+        o["observation_type"] if isinstance(o, dict) else o.observation_type: o
+        for o in observations
+    }
+
+
+@pytest.mark.usefixtures("app")
+class TestUpdateObservationSetMissing:
+    def test_patch_missing_obs_set(self, mocker: MockFixture) -> None:
+        query = mocker.patch.object(ObservationSet, "query")
+        query.options.return_value.filter.return_value.first.return_value = None
+
+        with pytest.raises(EntityNotFoundException):
+            controller.update_observation_set(
+                observation_set_uuid="nope", updated_obs_set={}
+            )
+
 
 @pytest.mark.usefixtures("app", "jwt_send_clinician_uuid", "uses_sql_database")
 class TestUpdateObservationSet:
     @pytest.fixture
-    def an_obs_set(self, encounter_uuid: str, location_uuid: str) -> ObservationSet:
-        record_time = datetime(2019, 1, 1, 11, 59, 20, tzinfo=timezone.utc)
-        obs_set: Dict = ObservationSet.new(
-            observations=[
+    def an_obs_set_uuid(self, bulk_insert_obs_sets: Callable) -> str:
+        (uuid,) = bulk_insert_obs_sets(
+            [
                 {
-                    "patient_refused": False,
-                    "observation_value": 1,
-                    "observation_type": "spo2",
+                    "observations": [
+                        {
+                            "patient_refused": False,
+                            "observation_value": 1,
+                            "observation_type": "spo2",
+                        }
+                    ],
+                    "record_time": T_2019_01_01_115920,
+                    "score_system": "news2",
+                    "encounter_id": generate_uuid(),
                 }
-            ],
-            record_time=record_time,
-            score_system="news2",
-            spo2_scale=1,
-            encounter_id=encounter_uuid,
+            ]
         )
         db.session.commit()
-        return ObservationSet.query.get(obs_set["uuid"])
+        return uuid
 
-    def test_patch_missing_obs_set(self) -> None:
-        with pytest.raises(EntityNotFoundException):
-            controller.update_observation_set(
-                observation_set_uuid="nope", updated_obs_set={}
-            )
+    @pytest.fixture
+    def an_obs_set(self, an_obs_set_uuid: str) -> ObservationSet:
+        # The load options are reapplied when the controller's commit expires it.
+        return db.session.get(
+            ObservationSet,
+            an_obs_set_uuid,
+            options=[joinedload(ObservationSet.observations)],
+        )
 
-    def test_patch_invalid_obs_set_without_type(
-        self, an_obs_set: ObservationSet
+    @pytest.mark.parametrize(
+        "observation",
+        [{"score_value": 1}, {"observation_type": "spo2"}],
+        ids=["without_type", "without_value"],
+    )
+    def test_patch_invalid_obs_set(
+        self, an_obs_set_uuid: str, observation: Dict
     ) -> None:
-
         with pytest.raises(ValueError):
             controller.update_observation_set(
-                observation_set_uuid=an_obs_set.uuid,
-                updated_obs_set={"observations": [{"score_value": 1}]},
+                observation_set_uuid=an_obs_set_uuid,
+                updated_obs_set={
+                    "score_severity": "high",
+                    "observations": [
+                        {"score_value": 2, "observation_type": "spo2"},
+                        observation,
+                    ],
+                },
             )
+        db.session.rollback()
 
-    def test_patch_invalid_obs_set_without_value(
-        self, an_obs_set: ObservationSet
-    ) -> None:
-
-        with pytest.raises(ValueError):
-            controller.update_observation_set(
-                observation_set_uuid=an_obs_set.uuid,
-                updated_obs_set={"observations": [{"observation_type": "spo2"}]},
+        # Nothing from the rejected patch reached the stored set.
+        obs_set = ObservationSet.__table__.c
+        assert db.session.execute(
+            select(obs_set.score_severity, obs_set.modified_by_).where(
+                obs_set.uuid == an_obs_set_uuid
             )
+        ).one() == (None, "unittest")
+        obs = Observation.__table__.c
+        assert db.session.execute(
+            select(obs.score_value, obs.modified_by_).where(
+                obs.observation_set_uuid == an_obs_set_uuid
+            )
+        ).one() == (None, "unittest")
 
     def test_patch_obs_set_success(self, an_obs_set: ObservationSet) -> None:
 
@@ -68,17 +114,9 @@ class TestUpdateObservationSet:
 
         # check dict response
         assert isinstance(response, dict)
-        observation_dict = next(
-            (i for i in response["observations"] if i["observation_type"] == "spo2"),
-            None,
-        )
-        assert observation_dict is not None
-        assert observation_dict["score_value"] == 2
+        assert _by_type(response["observations"])["spo2"]["score_value"] == 2
 
         # check model instance
-        observation = next(
-            (i for i in an_obs_set.observations if i.observation_type == "spo2"), None
-        )
-        assert observation is not None
+        observation = _by_type(an_obs_set.observations)["spo2"]
         assert isinstance(observation, Observation)
         assert observation.score_value == 2